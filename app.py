@@ -1,7 +1,29 @@
-from flask import Flask, render_template, request, jsonify, send_from_directory
+from flask import Flask, render_template, request, jsonify, send_from_directory, stream_with_context, g, has_app_context
+import click
 import csv
+import gzip
+import hashlib
+import heapq
+import json
+import logging
+import mmap
+import operator
 import os
-from collections import defaultdict
+import struct
+import sys
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import Counter, OrderedDict, defaultdict, deque, namedtuple
+from datetime import datetime, timedelta, timezone
+from itertools import chain
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+try:
+    import brotli # Optional; without it responses are offered gzip only
+except ImportError:
+    brotli = None
 
 app = Flask(__name__)
 
@@ -9,6 +31,18 @@ app = Flask(__name__)
 CSV_FILENAME = 'ultimate_tt.csv'
 BASE_DIR = os.path.abspath(os.path.dirname(__file__))
 CSV_PATH = os.path.join(BASE_DIR, CSV_FILENAME)
+SNAPSHOT_SUFFIX = '.ttsnap' # ultimate_tt.csv -> ultimate_tt.ttsnap, written by `flask build-snapshot`
+LOG_LEVEL = os.environ.get('TT_LOG_LEVEL', 'INFO').upper() # DEBUG brings back the per-request trace lines
+# Shared directory for cross-worker metrics; each gunicorn worker writes metrics-<pid>.json there.
+METRICS_DIR = os.environ.get('TT_METRICS_DIR') or os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+# Extra timetables: <DATASETS_DIR>/<name>.csv is served under /d/<name>/... or with ?dataset=<name>.
+DATASETS_DIR = os.environ.get('TT_DATASETS_DIR', os.path.join(BASE_DIR, 'datasets'))
+DEFAULT_DATASET = 'default' # CSV_PATH; always loaded
+MAX_LOADED_DATASETS = int(os.environ.get('TT_MAX_DATASETS', '8')) # Including the default one
+DATASET_MEMORY_BUDGET = int(float(os.environ.get('TT_DATASET_MEMORY_MB', '0')) * 1024 * 1024) # 0 = no budget
+DATASET_IDLE_SECONDS = float(os.environ.get('TT_DATASET_IDLE_SECONDS', '1800')) # 0 = never unload idle ones
+EMBED_OPTIONS_MAX = int(os.environ.get('TT_EMBED_OPTIONS_MAX', '500')) # Longer dropdowns become /search typeaheads
+MAX_REPORTED_ISSUES = 200 # Per load; further issues are only counted
 
 # --- CONSTANTS ---
 DAYS_ORDER = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday']
@@ -21,81 +55,1062 @@ LAB_TIME_SLOTS = [
     '08:30-10:30', '10:30-12:30', '01:30-03:30', '03:30-05:30', '04:30-06:30'
 ]
 LAB_PREFIX_CHECK = 'LAB BATCH'
+TUTORIAL_PREFIX_CHECK = 'TUT BATCH'
+DAY_INDEX = {day: i for i, day in enumerate(DAYS_ORDER)}
+SLOT_INDEX = {slot: i for i, slot in enumerate(TIME_SLOTS)}
+LAB_SLOT_INDEX = {slot: i for i, slot in enumerate(LAB_TIME_SLOTS)}
+IGNORED_ROOMS = ['TBD', 'SC07 Civil Department', 'Lang Lab']
+RELOAD_POLL_SECONDS = float(os.environ.get('TT_RELOAD_INTERVAL', '10')) # 0 disables hot reload
+LIVE_TIMEZONE = os.environ.get('TT_TIMEZONE', 'Asia/Kolkata') # The clock static/script.js uses for "now"
+MAX_BATCH_QUERIES = 2000
+SEARCH_LIMIT = 10 # Default /search results
+MAX_SEARCH_RESULTS = 50
+MAX_SEARCH_QUERY_LENGTH = 100
+MAX_DIFF_CHANGES = 1000 # Per change kind in a /diff response; the counts are always complete
+RESPONSE_CACHE_SIZE = 1024 # Comfortably above every valid classroom/teacher/subject/lab/day/slot query
+JSON_CACHE_CONTROL = 'public, max-age=300, stale-while-revalidate=60'
+STATIC_IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+# Variants are compressed inline on the cache miss that first asks for them, so both stay at
+# fast levels: brotli 11 spends seconds on a large day view for ~30% fewer bytes.
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+RESPONSE_ENCODINGS = ('br', 'gzip') if brotli else ('gzip',) # Server preference order
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5) # seconds
+METRICS_FLUSH_SECONDS = 5.0 # How stale another worker's numbers may be on /metrics
+
+# --- LOGGING ---
+logger = logging.getLogger('timetable')
+if not logger.handlers:
+    _log_handler = logging.StreamHandler(sys.stdout)
+    _log_handler.setFormatter(logging.Formatter('%(message)s'))
+    logger.addHandler(_log_handler)
+    logger.propagate = False
+logger.setLevel(LOG_LEVEL)
 
 # --- DATA LOADING ---
-def load_schedule_from_csv(path):
-    schedule = []
-    line_num = 0
+# The CSV is streamed through a pipeline of generator stages:
+#   decode -> validate -> normalize day/time -> classify lab vs theory -> dedupe lab sessions
+# Apart from the dedupe stage's set of lab rows seen, nothing holds more than
+# one row at a time. Bad rows are recorded in an IngestReport and skipped
+# instead of being printed or failing the whole load.
+CSV_COLUMNS = ('Subject', 'Teacher', 'Division', 'Day', 'Time', 'Room')
+ROW_FIELDS = tuple(name.lower() for name in CSV_COLUMNS) # Row dict keys, in CSV_COLUMNS order
+ESSENTIAL_FIELDS = ('subject', 'division', 'day', 'time', 'room')
+_essential_values = operator.itemgetter(*ESSENTIAL_FIELDS)
+DAY_ALIASES = {day[:3].lower(): day for day in DAYS_ORDER} # 'mon', 'Thurs' -> 'Thursday'
+
+class IngestReport:
+    """What one CSV load kept, dropped and why.
+
+    Every issue is counted by kind; the first `max_issues` are kept with
+    their line number. Errors drop the row, warnings keep it. `fatal` is
+    set when the file as a whole could not be read.
+    """
+
+    def __init__(self, path=None, max_issues=MAX_REPORTED_ISSUES):
+        self.path = path
+        self.max_issues = max_issues
+        self.rows_read = 0
+        self.rows_loaded = 0
+        self.counts = {}
+        self.issues = []
+        self.fatal = None
+        self.seconds = None
+
+    def add(self, line, kind, message, severity='error'):
+        self.counts[kind] = self.counts.get(kind, 0) + 1
+        if len(self.issues) < self.max_issues:
+            self.issues.append({'line': line, 'kind': kind, 'severity': severity, 'message': message})
+
+    @property
+    def rows_dropped(self):
+        return self.rows_read - self.rows_loaded
+
+    def summary(self):
+        return ', '.join(f"{count} {kind}" for kind, count in sorted(self.counts.items()))
+
+    def to_dict(self):
+        return {
+            'path': self.path,
+            'rows_read': self.rows_read,
+            'rows_loaded': self.rows_loaded,
+            'rows_dropped': self.rows_dropped,
+            'counts': dict(sorted(self.counts.items())),
+            'issues': self.issues,
+            'issues_truncated': sum(self.counts.values()) > len(self.issues),
+            'fatal': self.fatal,
+            'seconds': self.seconds,
+        }
+
+
+class EntitySets:
+    """The dropdown lists of ScheduleSnapshot.ENTITY_LISTS, filled row by row during ingest."""
+
+    def __init__(self):
+        self.subjects = set()
+        self.classrooms = set()
+        self.teachers = set()
+        self.lab_subjects = set()
+        self.divisions = set()
+        self.lab_batches = set()
+        self._split = {} # division string -> split_divisions() of it
+        self._seen_labs = set() # Lab subject strings already counted
+
+    def add(self, row):
+        if row['is_lab']:
+            if row['subject'] not in self._seen_labs:
+                self._seen_labs.add(row['subject'])
+                if row['lab_subject']:
+                    self.lab_subjects.add(row['lab_subject'])
+                batch = get_lab_batch(row['subject'])
+                if batch:
+                    self.lab_batches.add(batch)
+        else:
+            self.subjects.add(row['subject'])
+            if row['room'] and row['room'] not in IGNORED_ROOMS:
+                self.classrooms.add(row['room'])
+        if row['teacher']:
+            self.teachers.add(row['teacher'])
+        divisions = self._split.get(row['division'])
+        if divisions is None:
+            divisions = self._split[row['division']] = split_divisions(row['division'])
+        self.divisions.update(divisions)
+
+    def lists(self):
+        return {name: sorted(getattr(self, name)) for name in ScheduleSnapshot.ENTITY_LISTS}
+
+
+def _decode_records(csvfile, report):
+    """Stage 1: (line, fields) per CSV record, plus the column positions; a bad header is fatal.
+
+    The file is opened with errors='surrogateescape', so an invalid UTF-8
+    byte only spoils the fields it is in; _validate_rows drops those rows.
+    """
+    reader = csv.reader(csvfile)
+    header = [name.strip() for name in next(reader, [])]
+    missing = [name for name in CSV_COLUMNS if name not in header]
+    if missing:
+        report.fatal = f"missing column(s): {', '.join(missing)}"
+        return None, iter(())
+    positions = tuple(header.index(name) for name in CSV_COLUMNS)
+
+    def records():
+        while True:
+            try:
+                record = next(reader)
+            except StopIteration:
+                return
+            except csv.Error as e: # e.g. a NUL byte; the reader resumes on the next line
+                report.rows_read += 1
+                report.add(reader.line_num, 'unparsable', str(e))
+                continue
+            if record:
+                yield reader.line_num, record
+    return positions, records()
+
+def _validate_rows(records, positions, report):
+    """Stage 2: (line, fields) -> (line, row dict) for records with every essential field."""
+    width = max(positions) + 1
+    fields = tuple(zip(ROW_FIELDS, positions))
+    for line, record in records:
+        report.rows_read += 1
+        if len(record) < width:
+            report.add(line, 'short_row', f"expected at least {width} fields, got {len(record)}")
+            continue
+        row = {name: record[position].strip() for name, position in fields}
+        if not ''.join(row.values()).isascii():
+            undecodable = [name for name, value in row.items() if not _is_utf8(value)]
+            if undecodable:
+                report.add(line, 'bad_encoding', f"invalid UTF-8 in {', '.join(undecodable)}")
+                continue
+        if '' in _essential_values(row):
+            report.add(line, 'missing_field', f"empty {', '.join(name for name in ESSENTIAL_FIELDS if not row[name])}")
+            continue
+        yield line, row
+
+def _is_utf8(value):
     try:
-        with open(path, mode='r', newline='', encoding='utf-8') as csvfile:
-            reader = csv.DictReader(csvfile)
-            essential_keys = ['Subject', 'Division', 'Day', 'Time', 'Room']
-            all_keys = ['Subject', 'Teacher', 'Division', 'Day', 'Time', 'Room']
-            for row in reader:
-                line_num += 1
-                if not all(key in row for key in all_keys):
-                    print(f"Skipping row {line_num} due to missing keys: {row}")
-                    continue
-                if all(row.get(key, '').strip() for key in essential_keys):
-                        schedule.append({
-                            'subject': row['Subject'].strip(),
-                            'teacher': row.get('Teacher', '').strip(),
-                            'division': row['Division'].strip(),
-                            'day': row['Day'].strip().capitalize(),
-                            'time': row['Time'].strip(),
-                            'room': row['Room'].strip()
-                        })
-        print(f"Successfully loaded {len(schedule)} schedule entries.")
-        return schedule
+        value.encode('utf-8') # Lone surrogates left by surrogateescape refuse to encode
+        return True
+    except UnicodeEncodeError:
+        return False
+
+def _normalize_rows(rows, report):
+    """Stage 3: canonical day names and slot strings; rows off the grid are kept with a warning."""
+    for line, row in rows:
+        day = row['day'].capitalize()
+        if day not in DAY_INDEX:
+            day = DAY_ALIASES.get(day[:3].lower(), day)
+            if day in DAY_INDEX:
+                report.add(line, 'repaired_day', f"day '{row['day']}' read as '{day}'", 'warning')
+            else:
+                report.add(line, 'unknown_day', f"day '{row['day']}' is not one of DAYS_ORDER", 'warning')
+        row['day'] = day
+        if row['time'] not in SLOT_MASK_TABLE:
+            time_slot = normalize_slot_string(row['time'])
+            if time_slot in SLOT_MASK_TABLE:
+                report.add(line, 'repaired_time', f"time '{row['time']}' read as '{time_slot}'", 'warning')
+                row['time'] = time_slot
+            else:
+                report.add(line, 'unknown_time', f"time '{row['time']}' is not a known slot", 'warning')
+        yield line, row
+
+def normalize_slot_string(time_str):
+    """'8:30 – 9:30' -> '08:30-09:30'; other strings come back with only their spacing tidied."""
+    parts = [part.strip() for part in time_str.replace('\u2013', '-').replace('\u2014', '-').split('-')]
+    return '-'.join(part.zfill(5) if len(part) == 4 and part[1] == ':' else part for part in parts)
+
+def classify_subject(subject):
+    """(is_lab, lab_subject) for a subject string; lab_subject is None for theory classes."""
+    is_lab = subject.upper().startswith(LAB_PREFIX_CHECK)
+    return is_lab, get_clean_lab_subject(subject) if is_lab else None
+
+def _classify_rows(rows):
+    """Stage 4: tags each row as lab or theory, with its LABS-view subject."""
+    classified = {} # A timetable has far fewer subjects than rows
+    for line, row in rows:
+        subject = row['subject']
+        if subject not in classified:
+            classified[subject] = classify_subject(subject)
+        row['is_lab'], row['lab_subject'] = classified[subject]
+        yield line, row
+
+def _dedupe_lab_sessions(rows, report):
+    """Stage 5: drops a lab row repeated verbatim (exports list some sessions once per batch list)."""
+    seen = set()
+    for line, row in rows:
+        if row['is_lab']:
+            key = (row['subject'], row['teacher'], row['division'], row['day'], row['time'], row['room'])
+            if key in seen:
+                report.add(line, 'duplicate_lab_session', 'same lab, batch, room and time as an earlier row', 'warning')
+                continue
+            seen.add(key)
+        yield line, row
+
+def load_schedule_from_csv(path, schedule=None, report=None, entities=None):
+    """Streams the timetable CSV through the ingest pipeline into `schedule` (a new list unless
+    a ColumnarSchedule or other appendable is passed). Returns it, or None if the file could
+    not be read at all; `report` (an IngestReport) says what was skipped and why, and
+    `entities` (an EntitySets) collects the dropdown lists in the same pass."""
+    schedule = [] if schedule is None else schedule
+    report = IngestReport(path) if report is None else report
+    started = time.perf_counter()
+    try:
+        with open(path, mode='r', newline='', encoding='utf-8-sig', errors='surrogateescape') as csvfile:
+            positions, records = _decode_records(csvfile, report)
+            if positions is None:
+                logger.error("ERROR: %s cannot be loaded: %s", path, report.fatal)
+                return None
+            rows = _classify_rows(_normalize_rows(_validate_rows(records, positions, report), report))
+            for line, row in _dedupe_lab_sessions(rows, report):
+                schedule.append(row)
+                if entities is not None:
+                    entities.add(row)
+                report.rows_loaded += 1
     except FileNotFoundError:
-        print(f"ERROR: The file {path} was not found.")
+        report.fatal = 'file not found'
+        logger.error("ERROR: The file %s was not found.", path)
         return None
-    except Exception as e:
-        print(f"An error occurred during CSV loading (around line {line_num}): {e}")
+    except OSError as e:
+        report.fatal = f"{type(e).__name__} after {report.rows_read} rows: {e}"
+        logger.error("An error occurred during CSV loading (after %d rows): %s", report.rows_read, e)
         return None
+    finally:
+        report.seconds = time.perf_counter() - started
+    logger.info("Successfully loaded %d schedule entries.", report.rows_loaded)
+    if report.counts:
+        logger.warning("%s: %d of %d rows dropped; issues: %s.", path, report.rows_dropped, report.rows_read, report.summary())
+    return schedule
 
-SCHEDULE_DATA = load_schedule_from_csv(CSV_PATH)
-
-if SCHEDULE_DATA:
-    ignored_rooms = ['TBD', 'SC07 Civil Department', 'Lang Lab'] 
-
-    UNIQUE_SUBJECTS = sorted(list(set(
-        e['subject'] for e in SCHEDULE_DATA 
-        if e.get('subject') and not e['subject'].upper().startswith(LAB_PREFIX_CHECK)
-    )))
-    CLASSROOMS = sorted(list(set(
-        e['room'] for e in SCHEDULE_DATA 
-        if e.get('room') and \
-            e.get('subject') and \
-            not e['subject'].upper().startswith(LAB_PREFIX_CHECK) and \
-            e['room'] not in ignored_rooms
-    )))
-    UNIQUE_TEACHERS = sorted(list(set(e['teacher'] for e in SCHEDULE_DATA if e.get('teacher'))))
-    
-    lab_subjects_set = set()
-    for entry in SCHEDULE_DATA:
-        subject_name = entry.get('subject', '')
-        if subject_name.upper().startswith(LAB_PREFIX_CHECK):
-            parts = subject_name.split('-', 1) 
-            if len(parts) > 1:
-                lab_subject_raw = parts[1].strip()
-                lab_subject_clean = lab_subject_raw.split('(', 1)[0].strip()
-                if lab_subject_clean:
-                    lab_subjects_set.add(lab_subject_clean)
-    UNIQUE_LAB_SUBJECTS = sorted(list(lab_subjects_set))
-
-else:
-    UNIQUE_SUBJECTS = []
-    CLASSROOMS = []
-    UNIQUE_TEACHERS = []
-    UNIQUE_LAB_SUBJECTS = [] 
-    print("Warning: SCHEDULE_DATA is empty or failed to load.")
+def get_clean_lab_subject(subject_name):
+    """Returns the lab subject shown in the LABS dropdown for a 'LAB BATCH ...' subject, else None.
+
+    'LAB Batch 1-ECE-Essentials of Civil Engineering (P)' -> 'ECE-Essentials of Civil Engineering'
+    """
+    if not subject_name or not subject_name.upper().startswith(LAB_PREFIX_CHECK):
+        return None
+    parts = subject_name.split('-', 1)
+    if len(parts) > 1:
+        lab_subject_raw = parts[1].strip()
+        return lab_subject_raw.split('(', 1)[0].strip() or None
+    return None
+
+
+# --- COLUMNAR STORAGE ---
+class ColumnarSchedule:
+    """Schedule rows stored as parallel integer columns over one interned string table.
+
+    Every distinct subject/teacher/division/day/time/room string is kept
+    once in `strings`; the text columns hold its code. They are built as
+    array('I') and narrowed to array('H') by compact() once loading is done
+    and the string table fits in 16 bits. Day, hourly slot and 2-hour
+    lab slot are precomputed as small ints (-1 when off the grid), so the
+    builders only touch strings when they format a cell.
+
+    Indexing or iterating yields decoded row dicts for code that wants them.
+    """
+
+    TEXT_FIELDS = ('subject', 'teacher', 'division', 'day', 'time', 'room')
+    CODE_FIELDS = TEXT_FIELDS + ('lab_subject',)
+    SMALL_INT_FIELDS = ('day_idx', 'slot_idx', 'lab_slot_idx', 'is_lab')
+
+    def __init__(self, rows=()):
+        self.strings = ['']
+        self.codes = {'': 0}
+        for field in self.CODE_FIELDS:
+            setattr(self, field, array('I'))
+        self.day_idx = array('b')
+        self.slot_idx = array('b')
+        self.lab_slot_idx = array('b')
+        self.is_lab = array('B')
+        for row in rows:
+            self.append(row)
+
+    @classmethod
+    def from_columns(cls, strings, columns):
+        """Wraps already-built columns (arrays or memoryviews) without copying them."""
+        store = cls.__new__(cls)
+        store.strings = strings
+        store.codes = {value: code for code, value in enumerate(strings)}
+        for field, column in columns.items():
+            setattr(store, field, column)
+        return store
+
+    def intern(self, value):
+        code = self.codes.get(value)
+        if code is None:
+            code = len(self.strings)
+            self.strings.append(value)
+            self.codes[value] = code
+        return code
+
+    def append(self, row):
+        for field in self.TEXT_FIELDS:
+            getattr(self, field).append(self.intern(row[field]))
+        self.day_idx.append(DAY_INDEX.get(row['day'], -1))
+        self.slot_idx.append(SLOT_INDEX.get(row['time'], -1))
+        self.lab_slot_idx.append(LAB_SLOT_INDEX.get(get_lab_slot_string(row['time']), -1))
+        if 'is_lab' in row: # Already classified by the ingest pipeline
+            is_lab, lab_subject = row['is_lab'], row['lab_subject']
+        else:
+            is_lab, lab_subject = classify_subject(row['subject'])
+        self.is_lab.append(is_lab)
+        self.lab_subject.append(self.intern(lab_subject) if lab_subject else 0)
+
+    def compact(self):
+        """Narrows the code columns to 16 bits when the string table allows it. Call it only
+        after the last append: a narrowed column cannot take a code past 65535."""
+        if len(self.strings) <= 0xFFFF:
+            for field in self.CODE_FIELDS:
+                setattr(self, field, array('H', getattr(self, field)))
+
+    def nbytes(self):
+        """Approximate memory held by the columns and the string table."""
+        columns = sum(memoryview(getattr(self, field)).nbytes for field in self.CODE_FIELDS + self.SMALL_INT_FIELDS)
+        return columns + sum(sys.getsizeof(value) for value in self.strings)
+
+    def row(self, i):
+        strings = self.strings
+        return {field: strings[getattr(self, field)[i]] for field in self.TEXT_FIELDS}
+
+    def __len__(self):
+        return len(self.subject)
+
+    def __getitem__(self, i):
+        return self.row(i)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.row(i)
+
+
+def get_lab_batch(subject_name):
+    """'LAB Batch 3-ECE-Essentials of Civil Engineering' -> 'Batch 3'; None for theory subjects."""
+    if not subject_name or not subject_name.upper().startswith(LAB_PREFIX_CHECK):
+        return None
+    batch = subject_name.split('-', 1)[0][len('LAB'):].strip()
+    return batch or None
+
+def get_tutorial_batch(subject_name):
+    """'Tut Batch 2-MAC' -> 'Batch 2'; None for every other subject."""
+    if not subject_name or not subject_name.upper().startswith(TUTORIAL_PREFIX_CHECK):
+        return None
+    return subject_name.split('-', 1)[0][len('Tut'):].strip() or None
+
+def get_parent_batch(batch):
+    """'Batch 1A' -> 'Batch 1', the whole batch a lettered sub-batch belongs to; None otherwise."""
+    if not batch:
+        return None
+    parent = batch.rstrip('ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz')
+    return parent if parent != batch and parent[-1:].isdigit() else None
+
+def split_divisions(division):
+    """'Division 1&2' -> ['Division 1', 'Division 2']; anything else (e.g. 'Division 7- E&TC 18')
+    is returned as a single division."""
+    if '&' not in division:
+        return [division]
+    first, *others = [part.strip() for part in division.split('&')]
+    stem = first.rstrip('0123456789').rstrip()
+    if not stem or not all(part.isdigit() or part.startswith(stem) for part in others):
+        return [division]
+    return [first] + [part if not part.isdigit() else f"{stem} {part}" for part in others]
+
+
+# --- SCHEDULE INDEX ---
+class ScheduleIndex:
+    """Buckets the row ids of a ColumnarSchedule once by every key the API filters on.
+
+    Each bucket keeps rows in their original CSV order, so the grid
+    builders produce exactly what a full scan of the schedule would.
+    """
+
+    BUCKET_NAMES = ('by_room', 'by_teacher', 'by_subject', 'by_lab_subject', 'by_day', 'by_day_slot', 'by_division')
+
+    @classmethod
+    def from_buckets(cls, buckets):
+        """Wraps prebuilt {key: row ids} buckets, e.g. ones mapped from a binary snapshot."""
+        index = cls.__new__(cls)
+        for name in cls.BUCKET_NAMES:
+            setattr(index, name, buckets[name])
+        return index
+
+    def __init__(self, store):
+        by_room = defaultdict(lambda: array('I'))
+        by_teacher = defaultdict(lambda: array('I'))
+        by_subject = defaultdict(lambda: array('I'))
+        by_lab_subject = defaultdict(lambda: array('I'))
+        by_day = defaultdict(lambda: array('I'))
+        by_day_slot = defaultdict(lambda: array('I'))
+        by_division = defaultdict(lambda: array('I'))
+
+        if store:
+            strings = store.strings
+            divisions = {} # division code -> split_divisions() of it
+            for row in range(len(store)):
+                by_room[strings[store.room[row]]].append(row)
+                by_teacher[strings[store.teacher[row]]].append(row)
+                by_subject[strings[store.subject[row]]].append(row)
+                day = strings[store.day[row]]
+                by_day[day].append(row)
+                by_day_slot[(day, strings[store.time[row]])].append(row)
+                if store.lab_subject[row]:
+                    by_lab_subject[strings[store.lab_subject[row]]].append(row)
+                division_code = store.division[row]
+                if division_code not in divisions:
+                    divisions[division_code] = split_divisions(strings[division_code])
+                for division in divisions[division_code]: # 'Division 1&2' rows belong to both
+                    by_division[division].append(row)
+
+        self.by_room = dict(by_room)
+        self.by_teacher = dict(by_teacher)
+        self.by_subject = dict(by_subject)
+        self.by_lab_subject = dict(by_lab_subject)
+        self.by_day = dict(by_day)
+        self.by_day_slot = dict(by_day_slot)
+        self.by_division = dict(by_division)
+
+    @staticmethod
+    def _lookup(bucket, key):
+        return bucket.get(key, ())
+
+    def for_room(self, room):
+        return self._lookup(self.by_room, room)
+
+    def for_teacher(self, teacher):
+        return self._lookup(self.by_teacher, teacher)
+
+    def for_subject(self, subject):
+        return self._lookup(self.by_subject, subject)
+
+    def for_lab_subject(self, lab_subject):
+        return self._lookup(self.by_lab_subject, lab_subject)
+
+    def for_day(self, day):
+        return self._lookup(self.by_day, day)
+
+    def for_day_slot(self, day, time_slot):
+        return self._lookup(self.by_day_slot, (day, time_slot))
+
+    def for_division(self, division):
+        return self._lookup(self.by_division, division)
+
+    def nbytes(self):
+        """Approximate memory held by the row id buckets."""
+        return sum(memoryview(rows).nbytes + 64 # Rough per-key dict and key overhead
+                   for name in self.BUCKET_NAMES for rows in getattr(self, name).values())
+
+
+def compute_dataset_version(path):
+    """Short content hash of the CSV; changes whenever the timetable does."""
+    try:
+        with open(path, 'rb') as csvfile:
+            return hashlib.sha1(csvfile.read()).hexdigest()[:16]
+    except OSError:
+        return 'empty'
+
+
+def get_dataset_mtime(path):
+    """Last-Modified time of the CSV (whole seconds, as HTTP dates carry no more)."""
+    try:
+        return datetime.fromtimestamp(int(os.path.getmtime(path)), tz=timezone.utc)
+    except OSError:
+        return None
+
+
+def get_file_signature(path):
+    """(mtime_ns, size) of a file, or None if it is missing. Cheap enough to poll."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+# --- SCHEDULE SNAPSHOT ---
+class ScheduleSnapshot:
+    """One loaded timetable plus everything derived from it.
+
+    A snapshot is fully built before it is published and never mutated
+    afterwards. Request handlers grab the current snapshot once and use
+    only that, so a reload swapping in a new one mid-request is harmless.
+    The one exception is the DERIVED structures, built from the snapshot on
+    first use through derived() and kept for as long as it lives.
+    """
+
+    ENTITY_LISTS = ('subjects', 'classrooms', 'teachers', 'lab_subjects', 'divisions', 'lab_batches')
+    DERIVED = ('room_occupancy', 'search_index', 'utilisation')
+
+    def __init__(self, schedule, version='empty', mtime=None, signature=None, source_path=None,
+                 index=None, entity_lists=None, ingest_report=None):
+        self.schedule = schedule # ColumnarSchedule, or None when the CSV failed to load
+        self.ingest_report = ingest_report # IngestReport.to_dict() of the CSV load behind this snapshot
+        self.version = version
+        self.mtime = mtime
+        self.signature = signature
+        self.source_path = source_path
+        self.load_seconds = None # Set by load_snapshot()
+        self._nbytes = None
+        self._derived = dict.fromkeys(self.DERIVED) # name -> structure built by derived(), or None
+        self.index = index if index is not None else ScheduleIndex(schedule)
+
+        if entity_lists is not None: # EntitySets.lists(), built by the ingest pass or read back from a .ttsnap
+            for name in self.ENTITY_LISTS:
+                setattr(self, name, list(entity_lists[name]))
+        else:
+            self.subjects = []
+            self.classrooms = []
+            self.teachers = []
+            self.lab_subjects = []
+            self.divisions = []
+            self.lab_batches = []
+        self.classroom_set = frozenset(self.classrooms)
+        if not schedule:
+            logger.warning("Warning: schedule data is empty or failed to load.")
+
+    def derived(self, name, build):
+        """The DERIVED structure `name`, built by `build(snapshot)` the first time it is asked for.
+
+        Builders depend only on the snapshot, so two requests racing to build
+        the same one just do the work twice and keep either result.
+        """
+        value = self._derived[name]
+        if value is None:
+            value = self._derived[name] = build(self)
+        return value
+
+    def nbytes(self):
+        """Approximate memory this snapshot keeps alive; what the dataset memory budget counts."""
+        if self._nbytes is None:
+            self._nbytes = (self.schedule.nbytes() if self.schedule else 0) + self.index.nbytes()
+        return self._nbytes
+
+    def validate(self):
+        """Returns why this snapshot must not replace a working one, or None if it is fine."""
+        if self.schedule is None:
+            fatal = self.ingest_report and self.ingest_report['fatal']
+            return f"{self.source_path} could not be read or parsed" + (f": {fatal}" if fatal else '')
+        if not self.schedule:
+            return f"{self.source_path} contains no valid schedule entries"
+        return None
+
+
+# --- BINARY SNAPSHOT FILE ---
+# Layout: 8-byte magic, uint32 header length, JSON header, then 8-byte aligned
+# sections (the string table as JSON, the column arrays, and each index's
+# row ids concatenated bucket after bucket). The header records every
+# section's (offset, nbytes, typecode), so the loader just maps the file and
+# casts memoryviews over it: no per-row work, and every worker shares the
+# same page-cache pages.
+SNAPSHOT_MAGIC = b'TTSNAP01'
+SNAPSHOT_FORMAT_VERSION = 2 # 2: adds the by_division index and divisions/lab_batches lists
+
+def get_binary_snapshot_path(csv_path):
+    return os.path.splitext(csv_path)[0] + SNAPSHOT_SUFFIX
+
+def write_binary_snapshot(snapshot, path):
+    """Serializes a loaded snapshot to `path` atomically (write to a temp file, then rename)."""
+    store = snapshot.schedule
+    blobs = []
+    sections = {}
+    offset = 0
+
+    def add_section(name, data, typecode):
+        nonlocal offset
+        data = bytes(data)
+        padding = -len(data) % 8
+        sections[name] = [offset, len(data), typecode]
+        blobs.append(data + b'\0' * padding)
+        offset += len(data) + padding
+
+    add_section('strings', json.dumps(store.strings, ensure_ascii=False).encode('utf-8'), 'json')
+    for field in ColumnarSchedule.CODE_FIELDS + ColumnarSchedule.SMALL_INT_FIELDS:
+        column = getattr(store, field)
+        typecode = column.typecode if isinstance(column, array) else column.format
+        add_section(field, column, typecode)
+
+    index_keys = {}
+    for name in ScheduleIndex.BUCKET_NAMES:
+        bucket = getattr(snapshot.index, name)
+        keys = list(bucket)
+        offsets = array('I', [0])
+        rows = array('I')
+        for key in keys:
+            rows.extend(bucket[key])
+            offsets.append(len(rows))
+        index_keys[name] = keys
+        add_section(name + '.offsets', offsets, 'I')
+        add_section(name + '.rows', rows, 'I')
+
+    header = json.dumps({
+        'format': SNAPSHOT_FORMAT_VERSION,
+        'byteorder': sys.byteorder,
+        'version': snapshot.version,
+        'source_signature': snapshot.signature,
+        'source_mtime': snapshot.mtime.timestamp() if snapshot.mtime else None,
+        'rows': len(store),
+        'entity_lists': {name: getattr(snapshot, name) for name in ScheduleSnapshot.ENTITY_LISTS},
+        'ingest_report': snapshot.ingest_report,
+        'index_keys': index_keys,
+        'sections': sections,
+    }, ensure_ascii=False).encode('utf-8')
+    preamble = SNAPSHOT_MAGIC + struct.pack('<I', len(header)) + header
+    preamble += b'\0' * (-len(preamble) % 8)
+
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    with open(tmp_path, 'wb') as snapshot_file:
+        snapshot_file.write(preamble)
+        for blob in blobs:
+            snapshot_file.write(blob)
+    os.replace(tmp_path, path)
+    return len(preamble) + offset
+
+def read_binary_snapshot(path, source_path):
+    """Maps a snapshot written by write_binary_snapshot. Returns None if it is missing,
+    stale relative to `source_path`, truncated or corrupt, or was written by an incompatible build."""
+    try:
+        with open(path, 'rb') as snapshot_file:
+            mapped = mmap.mmap(snapshot_file.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+    if mapped[:len(SNAPSHOT_MAGIC)] != SNAPSHOT_MAGIC:
+        return None
+    try:
+        return _map_binary_snapshot(mapped, source_path)
+    except (struct.error, ValueError, KeyError, TypeError, IndexError, AttributeError) as error:
+        # ValueError covers bad JSON and undecodable text too. The CSV is still there to fall back on.
+        logger.warning("Ignoring unreadable snapshot %s (%s: %s).", path, type(error).__name__, error)
+        return None
+
+def _map_binary_snapshot(mapped, source_path):
+    """The parsing half of read_binary_snapshot; raises on anything malformed."""
+    header_start = len(SNAPSHOT_MAGIC) + 4
+    (header_length,) = struct.unpack_from('<I', mapped, len(SNAPSHOT_MAGIC))
+    if header_start + header_length > len(mapped):
+        raise ValueError('header runs past the end of the file')
+    header = json.loads(mapped[header_start:header_start + header_length].decode('utf-8'))
+    if header.get('format') != SNAPSHOT_FORMAT_VERSION or header.get('byteorder') != sys.byteorder:
+        return None
+    source_signature = get_file_signature(source_path)
+    if source_signature is not None and list(source_signature) != header['source_signature']:
+        return None # The CSV changed after this snapshot was built
+
+    data_start = header_start + header_length
+    data_start += -data_start % 8
+    view = memoryview(mapped)
+
+    def section_bytes(name):
+        start, nbytes, typecode = header['sections'][name]
+        if start < 0 or nbytes < 0 or data_start + start + nbytes > len(mapped):
+            raise ValueError(f"section {name!r} runs past the end of the file")
+        return view[data_start + start:data_start + start + nbytes], typecode
+
+    def section(name):
+        data, typecode = section_bytes(name)
+        return data.cast(typecode)
+
+    strings = json.loads(bytes(section_bytes('strings')[0]).decode('utf-8'))
+    columns = {field: section(field)
+               for field in ColumnarSchedule.CODE_FIELDS + ColumnarSchedule.SMALL_INT_FIELDS}
+    if any(len(column) != header['rows'] for column in columns.values()):
+        raise ValueError('column lengths do not match the header')
+    store = ColumnarSchedule.from_columns(strings, columns)
+    store.mapped_file = mapped # Keeps the mapping open for as long as the store lives
+
+    buckets = {}
+    for name in ScheduleIndex.BUCKET_NAMES:
+        offsets = section(name + '.offsets')
+        rows = section(name + '.rows')
+        keys = header['index_keys'][name]
+        if len(offsets) != len(keys) + 1 or offsets[-1] != len(rows):
+            raise ValueError(f"index {name!r} does not match its keys")
+        if name == 'by_day_slot':
+            keys = [tuple(key) for key in keys]
+        buckets[name] = {key: rows[offsets[i]:offsets[i + 1]] for i, key in enumerate(keys)}
+
+    source_mtime = header.get('source_mtime')
+    return ScheduleSnapshot(store,
+                            version=header['version'],
+                            mtime=datetime.fromtimestamp(source_mtime, tz=timezone.utc) if source_mtime is not None else None,
+                            signature=tuple(header['source_signature']) if header['source_signature'] else None,
+                            source_path=source_path,
+                            index=ScheduleIndex.from_buckets(buckets),
+                            entity_lists=header['entity_lists'],
+                            ingest_report=header.get('ingest_report'))
+
+def load_snapshot(path):
+    """Loads the timetable at `path`, from its binary snapshot when one is present and current."""
+    started = time.perf_counter()
+    snapshot = read_binary_snapshot(get_binary_snapshot_path(path), path)
+    if snapshot is not None:
+        logger.info("Loaded %d schedule entries from %s.", len(snapshot.schedule), get_binary_snapshot_path(path))
+    else:
+        snapshot = load_snapshot_from_csv(path)
+    snapshot.load_seconds = time.perf_counter() - started
+    return snapshot
+
+def load_snapshot_from_csv(path):
+    # Signature first: if the file changes while we parse, the next poll sees a newer one.
+    signature = get_file_signature(path)
+    # Rows go straight into the columns; no list of dicts is ever held.
+    report = IngestReport(path)
+    entities = EntitySets()
+    store = load_schedule_from_csv(path, ColumnarSchedule(), report, entities)
+    if store is not None:
+        store.compact()
+    return ScheduleSnapshot(store,
+                            version=compute_dataset_version(path),
+                            mtime=get_dataset_mtime(path),
+                            signature=signature,
+                            source_path=path,
+                            entity_lists=entities.lists() if store is not None else None,
+                            ingest_report=report.to_dict())
+
+
+def current_dataset():
+    """The Dataset this request selected; the default one outside requests."""
+    return (has_app_context() and g.get('dataset')) or DATASETS.default
+
+def current_snapshot():
+    """The snapshot new requests should use. Read it once per request."""
+    return current_dataset().snapshot
+
+def publish_snapshot(snapshot):
+    current_dataset().publish(snapshot)
+
+
+# --- HOT RELOAD ---
+class ScheduleReloader:
+    """Polls the CSV and swaps in a freshly built snapshot when it changes.
+
+    Parsing and indexing happen on the watcher thread, off the request
+    path. A file that fails validation is reported and the old snapshot
+    stays in service.
+    """
+
+    def __init__(self, dataset, interval=RELOAD_POLL_SECONDS):
+        self.dataset = dataset
+        self.path = dataset.path
+        self.interval = interval
+        self.reloads = 0
+        self.failures = 0
+        self.last_reload_seconds = None
+        self.last_reload_at = None
+        self.last_error = None
+        self._lock = threading.Lock()
+        self._rejected_signature = None
+        self._thread = None
+        self._thread_pid = None
+        self._stopped = False
+
+    def check(self):
+        """Reloads if the file on disk differs from the published snapshot. Returns True on a swap."""
+        signature = get_file_signature(self.path)
+        if signature is None or signature in (self.dataset.snapshot.signature, self._rejected_signature):
+            return False
+        return self.reload()
+
+    def reload(self):
+        with self._lock:
+            started = time.perf_counter()
+            snapshot = load_snapshot(self.path)
+            elapsed = time.perf_counter() - started
+            error = snapshot.validate()
+            if error:
+                self.failures += 1
+                self.last_error = error
+                self._rejected_signature = snapshot.signature
+                logger.warning("Reload rejected, keeping version %s: %s", self.dataset.snapshot.version, error)
+                return False
+            old = self.dataset.snapshot
+            if snapshot.version == old.version:
+                # Touched but unchanged: adopt the new signature so we stop re-parsing it.
+                self.dataset.publish(snapshot)
+                return False
+            # Move the cache over before publishing, so no request on the new version finds it stale.
+            diff = SnapshotDiff(old, snapshot)
+            kept, dropped = self.dataset.cache.carry_over(old.version, snapshot.version, diff.affects)
+            self.dataset.publish(snapshot)
+            self.dataset.last_diff = diff
+            self.reloads += 1
+            self.last_reload_seconds = elapsed
+            self.last_reload_at = datetime.now(timezone.utc)
+            self.last_error = None
+            logger.info("Reloaded %d entries (version %s) in %.3fs: %d added, %d removed, %d moved; "
+                        "kept %d cached responses, dropped %d", len(snapshot.schedule), snapshot.version, elapsed,
+                        len(diff.added), len(diff.removed), len(diff.moved), kept, dropped)
+            return True
+
+    def ensure_started(self):
+        """Starts the watcher thread once per process (gunicorn forks after import)."""
+        if self.interval <= 0 or self._stopped or self._thread_pid == os.getpid():
+            return
+        self._thread_pid = os.getpid()
+        self._thread = threading.Thread(target=self._run, name='schedule-reloader', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Ends the watcher thread after its current sleep, e.g. when the dataset is unloaded."""
+        self._stopped = True
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            if self._stopped:
+                return
+            try:
+                self.check()
+            except Exception as e:
+                self.failures += 1
+                self.last_error = str(e)
+                logger.error("[ScheduleReloader] Error while checking %s: %s", self.path, e)
+
+    def stats(self):
+        snapshot = self.dataset.snapshot
+        return {
+            'dataset': self.dataset.name,
+            'version': snapshot.version,
+            'entries': len(snapshot.schedule or []),
+            'reloads': self.reloads,
+            'failures': self.failures,
+            'last_reload_seconds': self.last_reload_seconds,
+            'last_reload_at': self.last_reload_at.isoformat() if self.last_reload_at else None,
+            'last_error': self.last_error,
+            'last_diff': self.dataset.last_diff.summary() if self.dataset.last_diff else None,
+        }
+
+
+# --- DATASET REGISTRY ---
+class Dataset:
+    """One named timetable: its published snapshot, response cache and reloader."""
+
+    def __init__(self, name, path, snapshot=None):
+        self.name = name
+        self.path = path
+        self.snapshot = snapshot if snapshot is not None else load_snapshot(path)
+        self.cache = ResponseCache()
+        self.reloader = ScheduleReloader(self)
+        self.last_diff = None # SnapshotDiff of the last hot reload
+        self.last_used = time.monotonic()
+
+    def publish(self, snapshot):
+        # Rebinding an attribute is atomic; readers see the old or the new snapshot, never a mix.
+        self.snapshot = snapshot
+
+    def stats(self):
+        snapshot = self.snapshot
+        return {
+            'name': self.name,
+            'version': snapshot.version,
+            'entries': len(snapshot.schedule or []),
+            'approx_bytes': snapshot.nbytes(),
+            'load_seconds': snapshot.load_seconds,
+            'idle_seconds': round(time.monotonic() - self.last_used, 1),
+        }
+
+
+class DatasetRegistry:
+    """Every timetable this process can serve, loaded on first use.
+
+    `default` is CSV_PATH and stays loaded. Each <name>.csv in DATASETS_DIR
+    is another dataset; those are unloaded least recently used first when
+    more than MAX_LOADED_DATASETS are loaded, when their estimated size
+    pushes the total over DATASET_MEMORY_BUDGET, or after sitting idle for
+    DATASET_IDLE_SECONDS.
+    """
+
+    SWEEP_SECONDS = 60 # How often get() looks for idle datasets
+
+    def __init__(self, default_path, directory, max_loaded=MAX_LOADED_DATASETS,
+                 memory_budget=DATASET_MEMORY_BUDGET, idle_seconds=DATASET_IDLE_SECONDS):
+        self.directory = directory
+        self.max_loaded = max_loaded
+        self.memory_budget = memory_budget
+        self.idle_seconds = idle_seconds
+        self.default = Dataset(DEFAULT_DATASET, default_path)
+        self.evictions = 0
+        self._loaded = OrderedDict() # name -> Dataset, least recently used first; never holds the default
+        self._retired = dict.fromkeys(('hits', 'misses', 'reloads', 'failures'), 0)
+        self._paths = {}
+        self._paths_mtime = None
+        self._last_sweep = time.monotonic()
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+
+    def available(self):
+        """{name: CSV path} for every dataset that can be served, rescanning DATASETS_DIR when it changes."""
+        try:
+            mtime = os.stat(self.directory).st_mtime_ns
+        except OSError:
+            mtime = None
+        if mtime != self._paths_mtime:
+            paths = {}
+            if mtime is not None:
+                for filename in sorted(os.listdir(self.directory)):
+                    name, extension = os.path.splitext(filename)
+                    if extension.lower() == '.csv' and name != DEFAULT_DATASET:
+                        paths[name] = os.path.join(self.directory, filename)
+            self._paths, self._paths_mtime = paths, mtime
+        return {DEFAULT_DATASET: self.default.path, **self._paths}
+
+    def get(self, name):
+        """The Dataset called `name`, loading it if needed; None if there is no such dataset."""
+        now = time.monotonic()
+        if now - self._last_sweep > self.SWEEP_SECONDS:
+            self._last_sweep = now
+            with self._lock:
+                self._evict(now)
+        if name == DEFAULT_DATASET:
+            self.default.last_used = now
+            return self.default
+
+        dataset = self._touch(name, now)
+        if dataset is None:
+            path = self.available().get(name)
+            if path is None:
+                return None
+            # One load at a time; requests for datasets already loaded never wait on it.
+            with self._load_lock:
+                dataset = self._touch(name, now)
+                if dataset is None:
+                    dataset = Dataset(name, path)
+                    with self._lock:
+                        self._loaded[name] = dataset
+                        self._evict(now, keep=name)
+                    logger.info("Loaded dataset '%s' (%d entries, ~%d KiB).", name,
+                                len(dataset.snapshot.schedule or []), dataset.snapshot.nbytes() // 1024)
+        return dataset
+
+    def _touch(self, name, now):
+        with self._lock:
+            dataset = self._loaded.get(name)
+            if dataset is not None:
+                self._loaded.move_to_end(name)
+                dataset.last_used = now
+            return dataset
+
+    def _over_budget(self):
+        if len(self._loaded) + 1 > self.max_loaded:
+            return True
+        if self.memory_budget:
+            total = self.default.snapshot.nbytes() + sum(d.snapshot.nbytes() for d in self._loaded.values())
+            return total > self.memory_budget
+        return False
+
+    def _evict(self, now, keep=None):
+        # Caller holds self._lock.
+        for name, dataset in list(self._loaded.items()):
+            if name == keep:
+                continue
+            idle = self.idle_seconds and now - dataset.last_used > self.idle_seconds
+            if idle or self._over_budget():
+                del self._loaded[name]
+                dataset.reloader.stop()
+                cache = dataset.cache.stats()
+                self._retired['hits'] += cache['hits']
+                self._retired['misses'] += cache['misses']
+                self._retired['reloads'] += dataset.reloader.reloads
+                self._retired['failures'] += dataset.reloader.failures
+                self.evictions += 1
+                logger.info("Unloaded dataset '%s' (%s).", name, 'idle' if idle else 'over budget')
+
+    def loaded(self):
+        with self._lock:
+            return [self.default] + list(self._loaded.values())
+
+    def totals(self):
+        """Cache and reload counters summed over every dataset this process has served."""
+        totals = dict(self._retired)
+        for dataset in self.loaded():
+            cache = dataset.cache.stats()
+            totals['hits'] += cache['hits']
+            totals['misses'] += cache['misses']
+            totals['reloads'] += dataset.reloader.reloads
+            totals['failures'] += dataset.reloader.failures
+        return totals
+
+    def stats(self):
+        loaded = self.loaded()
+        return {
+            'available': sorted(self.available()),
+            'loaded': [dataset.stats() for dataset in loaded],
+            'approx_bytes': sum(dataset.snapshot.nbytes() for dataset in loaded),
+            'max_loaded': self.max_loaded,
+            'memory_budget': self.memory_budget,
+            'idle_seconds': self.idle_seconds,
+            'evictions': self.evictions,
+        }
+
+
+class DatasetPathMiddleware:
+    """Serves /d/<name>/<route> as <route> against dataset <name>.
+
+    The prefix moves into SCRIPT_NAME, so url_for() and request.script_root
+    keep pointing inside the dataset.
+    """
+
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+
+    def __call__(self, environ, start_response):
+        path = environ.get('PATH_INFO', '')
+        if path.startswith('/d/'):
+            name, _, rest = path[len('/d/'):].partition('/')
+            if name:
+                environ['tt.dataset'] = name
+                environ['SCRIPT_NAME'] = f"{environ.get('SCRIPT_NAME', '')}/d/{name}"
+                environ['PATH_INFO'] = '/' + rest
+        return self.wsgi_app(environ, start_response)
+
+app.wsgi_app = DatasetPathMiddleware(app.wsgi_app)
 
 
 # --- HELPER FUNCTIONS ---
 
 # --- NEW HELPER 1: Lab Slot String Getter (used in multiple places) ---
-def get_lab_slot_string(time_str):
+# The _parse_* helpers below are the reference string parsers. They run once per
+# known slot string to fill the TIME SLOT TABLES; the public helpers look there
+# first and only parse strings that are not in TIME_SLOTS/LAB_TIME_SLOTS.
+def _parse_lab_slot_string(time_str):
     if not time_str or ':' not in time_str: return None
     try:
         if time_str.startswith('08:30') or time_str.startswith('09:30'): return '08:30-10:30'
@@ -105,12 +1120,12 @@ def get_lab_slot_string(time_str):
         if time_str.startswith('03:30'): return '03:30-05:30'
         if time_str.startswith('04:30') or time_str.startswith('05:30'): return '04:30-06:30'
     except Exception as e:
-         print(f"[get_lab_slot_string] Error processing time '{time_str}': {e}")
+         logger.error("[get_lab_slot_string] Error processing time '%s': %s", time_str, e)
          return None
     return None
 
 # --- NEW HELPER 2: Time Slot to Decimal Converter ---
-def parse_time_to_decimal(time_str):
+def _parse_time_to_decimal(time_str):
     """Converts a time string like '08:30' or '01:30' to a decimal (8.5, 13.5)"""
     try:
         parts = time_str.split(':')
@@ -124,12 +1139,12 @@ def parse_time_to_decimal(time_str):
         return None
 
 # --- NEW HELPER 3: Time Slot Range to Decimals ---
-def parse_slot_range_to_decimal(slot_str):
+def _parse_slot_range_to_decimal(slot_str):
     """Converts a slot string '08:30-09:30' to decimal start/end (8.5, 9.5)"""
     try:
         start_str, end_str = slot_str.split('-')
-        start_decimal = parse_time_to_decimal(start_str)
-        end_decimal = parse_time_to_decimal(end_str)
+        start_decimal = _parse_time_to_decimal(start_str)
+        end_decimal = _parse_time_to_decimal(end_str)
         
         # Handle 12:30-01:30 (12.5 -> 13.5)
         if start_decimal and end_decimal:
@@ -152,8 +1167,7 @@ def parse_slot_range_to_decimal(slot_str):
         return None, None
 
 # --- NEW HELPER 4: Sort Key for 24-hour time ---
-def sort_key_by_time(entry):
-    time_str = entry.get('time', '99:99')
+def _parse_sort_minutes(time_str):
     parts = time_str.split('-')[0].split(':')
     try:
         if len(parts) >= 2: 
@@ -164,76 +1178,119 @@ def sort_key_by_time(entry):
         else: return 9999
     except: return 9999
 
+
+# --- TIME SLOT TABLES ---
+# Every hourly and lab slot string, resolved once at import. Each slot also
+# gets a bitmask over TIME_SLOTS (bit i = overlaps TIME_SLOTS[i]), so "does
+# this lab overlap that hour" is a single AND instead of two parses and a
+# float comparison per entry.
+KNOWN_SLOT_STRINGS = TIME_SLOTS + LAB_TIME_SLOTS
+KNOWN_TIME_STRINGS = sorted(set(part for slot in KNOWN_SLOT_STRINGS for part in slot.split('-')))
+
+TIME_DECIMAL_TABLE = {t: _parse_time_to_decimal(t) for t in KNOWN_TIME_STRINGS}
+SLOT_RANGE_TABLE = {slot: _parse_slot_range_to_decimal(slot) for slot in KNOWN_SLOT_STRINGS}
+SLOT_SORT_TABLE = {slot: _parse_sort_minutes(slot) for slot in KNOWN_SLOT_STRINGS}
+LAB_SLOT_TABLE = {slot: _parse_lab_slot_string(slot) for slot in KNOWN_SLOT_STRINGS}
+
+def _slot_mask(slot_str):
+    start, end = SLOT_RANGE_TABLE.get(slot_str) or _parse_slot_range_to_decimal(slot_str)
+    mask = 0
+    if start is None:
+        return mask
+    for i, hour_slot in enumerate(TIME_SLOTS):
+        hour_start, hour_end = SLOT_RANGE_TABLE[hour_slot]
+        if start < hour_end and end > hour_start:
+            mask |= 1 << i
+    return mask
+
+SLOT_MASK_TABLE = {slot: _slot_mask(slot) for slot in KNOWN_SLOT_STRINGS}
+LAB_SLOT_MASKS = [SLOT_MASK_TABLE[slot] for slot in LAB_TIME_SLOTS] # Indexed like LAB_TIME_SLOTS
+# For each hourly slot, the lab slot indices that are running during it
+LAB_SLOTS_DURING = [
+    frozenset(i for i, lab_mask in enumerate(LAB_SLOT_MASKS) if lab_mask & SLOT_MASK_TABLE[hour_slot])
+    for hour_slot in TIME_SLOTS
+]
+
+def get_lab_slot_string(time_str):
+    """Maps an hourly time like '03:30-04:30' to its 2-hour lab block ('03:30-05:30'), or None."""
+    lab_slot = LAB_SLOT_TABLE.get(time_str, False)
+    return lab_slot if lab_slot is not False else _parse_lab_slot_string(time_str)
+
+def parse_time_to_decimal(time_str):
+    """Converts a time string like '08:30' or '01:30' to a decimal (8.5, 13.5)"""
+    decimal = TIME_DECIMAL_TABLE.get(time_str, False)
+    return decimal if decimal is not False else _parse_time_to_decimal(time_str)
+
+def parse_slot_range_to_decimal(slot_str):
+    """Converts a slot string '08:30-09:30' to decimal start/end (8.5, 9.5)"""
+    return SLOT_RANGE_TABLE.get(slot_str) or _parse_slot_range_to_decimal(slot_str)
+
+def sort_key_by_time(entry):
+    time_str = entry.get('time', '99:99')
+    minutes = SLOT_SORT_TABLE.get(time_str)
+    return minutes if minutes is not None else _parse_sort_minutes(time_str)
+
 # --- NEW HELPER 5: The "Live Schedule" Logic ---
-def get_live_schedule(selected_day, selected_1hr_slot):
-    if not SCHEDULE_DATA or not selected_day or not selected_1hr_slot:
+def get_live_schedule(selected_day, selected_1hr_slot, snapshot=None):
+    snapshot = snapshot or current_snapshot()
+    if not snapshot.schedule or not selected_day or not selected_1hr_slot:
         return [], []
 
+    store = snapshot.schedule
+    strings = store.strings
     theory_classes = []
     lab_classes = []
     
     # Get the user's 1-hour time range (e.g., 16.5 to 17.5 for '04:30-05:30')
     user_start, user_end = parse_slot_range_to_decimal(selected_1hr_slot)
     if user_start is None:
-        print(f"Could not parse user slot: {selected_1hr_slot}")
+        logger.warning("Could not parse user slot: %s", selected_1hr_slot)
         return [], []
 
-    print(f"Finding schedule for {selected_day} @ {selected_1hr_slot} ({user_start} to {user_end})")
+    logger.debug("Finding schedule for %s @ %s (%s to %s)", selected_day, selected_1hr_slot, user_start, user_end)
+
+    # Lab blocks overlapping the user's hour, straight from the slot table
+    user_slot = SLOT_INDEX.get(selected_1hr_slot)
+    if user_slot is not None:
+        lab_slots_running = LAB_SLOTS_DURING[user_slot]
+    else:
+        user_mask = _slot_mask(selected_1hr_slot)
+        lab_slots_running = frozenset(i for i, lab_mask in enumerate(LAB_SLOT_MASKS) if lab_mask & user_mask)
 
     # --- Find Theory Classes ---
-    for entry in SCHEDULE_DATA:
-        if entry.get('day') == selected_day and \
-           entry.get('time') == selected_1hr_slot and \
-           not entry.get('subject', '').upper().startswith(LAB_PREFIX_CHECK):
-            
+    for row in snapshot.index.for_day_slot(selected_day, selected_1hr_slot):
+        if not store.is_lab[row]:
             theory_classes.append({
-                'subject': entry.get('subject', 'N/A'),
-                'division': entry.get('division', 'N/A'),
-                'room': entry.get('room', 'N/A'),
-                'teacher': entry.get('teacher', 'N/A').strip() or 'N/A',
-                'time': entry.get('time') # Store the 1-hour slot
+                'subject': strings[store.subject[row]],
+                'division': strings[store.division[row]],
+                'room': strings[store.room[row]],
+                'teacher': strings[store.teacher[row]] or 'N/A',
+                'time': strings[store.time[row]] # Store the 1-hour slot
             })
 
     # --- Find Lab Classes ---
     processed_lab_sessions = set()
-    lab_entries_today = []
-    
-    # 1. Find all raw lab entries for the day
-    for entry in SCHEDULE_DATA:
-         if entry.get('day') == selected_day and \
-            entry.get('subject', '').upper().startswith(LAB_PREFIX_CHECK):
-            lab_entries_today.append(entry)
-
-    # 2. De-duplicate and check for overlap
-    for entry in lab_entries_today:
-        session_key = (entry.get('subject'), entry.get('division'), entry.get('room'), entry.get('teacher', ''))
+
+    # De-duplicate the day's lab rows and check for overlap
+    for row in snapshot.index.for_day(selected_day):
+        if not store.is_lab[row]:
+            continue
+        session_key = (store.subject[row], store.division[row], store.room[row], store.teacher[row])
         if session_key not in processed_lab_sessions:
             
-            # Get the full 2-hour slot (e.g., '03:30-05:30')
-            lab_slot_2hr = get_lab_slot_string(entry.get('time'))
+            # The row's 2-hour lab block (e.g., '03:30-05:30') was resolved at load time
+            lab_slot = store.lab_slot_idx[row]
             
-            if lab_slot_2hr:
-                # Convert 2-hour slot to decimals (e.g., 15.5 to 17.5)
-                lab_start, lab_end = parse_slot_range_to_decimal(lab_slot_2hr)
-                
-                if lab_start is None:
-                    print(f"Could not parse lab slot: {lab_slot_2hr}")
-                    continue
-                
-                # *** THE OVERLAP CHECK ***
-                # if user's slot [user_start, user_end]
-                # and lab's slot [lab_start, lab_end]
-                # overlap if (user_start < lab_end) and (user_end > lab_start)
-                
-                if (user_start < lab_end) and (user_end > lab_start):
-                    lab_classes.append({
-                        'subject': entry.get('subject', 'N/A'),
-                        'division': entry.get('division', 'N/A'),
-                        'room': entry.get('room', 'N/A'),
-                        'teacher': entry.get('teacher', 'N/A').strip() or 'N/A',
-                        'time': lab_slot_2hr # Store the 2-hour slot
-                    })
-                    processed_lab_sessions.add(session_key)
+            # *** THE OVERLAP CHECK *** (precomputed in LAB_SLOTS_DURING)
+            if lab_slot in lab_slots_running:
+                lab_classes.append({
+                    'subject': strings[store.subject[row]],
+                    'division': strings[store.division[row]],
+                    'room': strings[store.room[row]],
+                    'teacher': strings[store.teacher[row]] or 'N/A',
+                    'time': LAB_TIME_SLOTS[lab_slot] # Store the 2-hour slot
+                })
+                processed_lab_sessions.add(session_key)
 
     # Sort the final lists
     theory_classes.sort(key=lambda x: (x['subject'], x['division']))
@@ -242,276 +1299,1849 @@ def get_live_schedule(selected_day, selected_1hr_slot):
     return theory_classes, lab_classes
 
 
-# --- (Existing Helper Functions - Unchanged) ---
+def live_schedule_payload(selected_day, selected_slot, snapshot):
+    theory, labs = get_live_schedule(selected_day, selected_slot, snapshot)
+    return {
+        'title': f"Schedule for {selected_day}, {selected_slot}",
+        'theory_classes': theory,
+        'lab_classes': labs
+    }
+
+def get_live_body(dataset, selected_day, selected_slot):
+    """The /get_live_schedule JSON body for `dataset`, shared with that route through its response cache."""
+    with app.app_context():
+        g.dataset = dataset
+        snapshot = dataset.snapshot
+        return get_cached_body(snapshot, ('live', selected_day, selected_slot),
+                               lambda: live_schedule_payload(selected_day, selected_slot, snapshot))
+
+try:
+    LIVE_TZ = ZoneInfo(LIVE_TIMEZONE)
+except (ZoneInfoNotFoundError, ValueError):
+    # No tz database on this host; the default zone has had a fixed offset since 1945.
+    LIVE_TZ = timezone(timedelta(hours=5, minutes=30)) if LIVE_TIMEZONE == 'Asia/Kolkata' else timezone.utc
+
+def current_day_slot(now=None):
+    """(day, hourly slot) running at `now` on the LIVE_TIMEZONE clock; None for either outside teaching hours."""
+    now = now or datetime.now(LIVE_TZ)
+    day = now.strftime('%A')
+    if day not in DAY_INDEX:
+        return None, None
+    hour = now.hour + now.minute / 60
+    for slot in TIME_SLOTS:
+        start, end = parse_slot_range_to_decimal(slot)
+        if start <= hour < end:
+            return day, slot
+    return day, None
+
 
-def build_classroom_grid(selected_room):
-    grid = {time: defaultdict(lambda: 'Free') for time in TIME_SLOTS}
-    if not SCHEDULE_DATA: return {t: dict(g) for t, g in grid.items()}
-    for entry in SCHEDULE_DATA:
-        if all(k in entry for k in ['room', 'time', 'day', 'subject', 'division', 'teacher']):
-            if entry['room'] == selected_room:
-                if entry['time'] in grid and entry['day'] in DAYS_ORDER:
-                    grid[entry['time']][entry['day']] = f"{entry['subject']}<br>{entry['division']}<br>{entry['teacher']}"
+# --- GRID BUILDERS ---
+# These walk row ids from the index and compare integer codes; strings are
+# only decoded when a cell's text is formatted.
+
+def _empty_grid(slots):
+    return {slot: {} for slot in slots}
+
+def _finish_grid(grid):
+    # Days/rooms never filled stay absent, exactly like the old defaultdict('Free') grids.
     return {t: dict(g) for t, g in grid.items()}
 
-def build_day_view(selected_day):
-    print(f"\n--- Building Day View for: {selected_day} ---")
-    classroom_grid = {time: defaultdict(lambda: 'Free') for time in TIME_SLOTS}
-    if SCHEDULE_DATA:
-        for entry in SCHEDULE_DATA:
-            subject_upper = entry.get('subject', '').strip().upper()
-            if entry.get('day') == selected_day and \
-                not subject_upper.startswith(LAB_PREFIX_CHECK) and \
-                entry.get('time') in classroom_grid and \
-                entry.get('room') in CLASSROOMS and \
-                entry.get('day') in DAYS_ORDER:
-                    classroom_grid[entry['time']][entry['room']] = f"{entry.get('subject', 'N/A')}<br>{entry.get('division', 'N/A')}<br>{entry.get('teacher', 'N/A')}"
-    
-    # Uses the global helper function now
-    _get_lab_slot_string = get_lab_slot_string 
+def build_classroom_grid(selected_room, snapshot=None):
+    snapshot = snapshot or current_snapshot()
+    grid = _empty_grid(TIME_SLOTS)
+    if not snapshot.schedule: return _finish_grid(grid)
+    store = snapshot.schedule
+    strings = store.strings
+    for row in snapshot.index.for_room(selected_room):
+        slot, day = store.slot_idx[row], store.day_idx[row]
+        if slot >= 0 and day >= 0:
+            grid[TIME_SLOTS[slot]][DAYS_ORDER[day]] = f"{strings[store.subject[row]]}<br>{strings[store.division[row]]}<br>{strings[store.teacher[row]]}"
+    return _finish_grid(grid)
 
+def build_day_view(selected_day, snapshot=None):
+    snapshot = snapshot or current_snapshot()
+    logger.debug("--- Building Day View for: %s ---", selected_day)
+    classroom_grid = _empty_grid(TIME_SLOTS)
     labs_today = []
-    lab_count_found = 0
-    if SCHEDULE_DATA:
-        print(f"Processing {len(SCHEDULE_DATA)} entries for labs on {selected_day}. Checking prefix '{LAB_PREFIX_CHECK}'...")
-        for i, entry in enumerate(SCHEDULE_DATA):
-            if entry.get('day') == selected_day:
-                subject_original = entry.get('subject', None)
-                if subject_original is not None:
-                    subject_stripped = subject_original.strip()
-                    subject_upper = subject_stripped.upper()
-                    if subject_upper.startswith(LAB_PREFIX_CHECK):
-                            if all(entry.get(k, '').strip() for k in ['subject', 'division', 'room', 'time']): 
-                                labs_today.append(entry)
-                                lab_count_found += 1
-        print(f"Found {lab_count_found} raw entries matching prefix criteria for {selected_day}.")
+    store = snapshot.schedule
+    if store:
+        strings = store.strings
+        day_rows = snapshot.index.for_day(selected_day)
+        for row in day_rows:
+            if store.is_lab[row]:
+                labs_today.append(row)
+                continue
+            slot = store.slot_idx[row]
+            room = strings[store.room[row]]
+            if slot >= 0 and room in snapshot.classroom_set and store.day_idx[row] >= 0:
+                classroom_grid[TIME_SLOTS[slot]][room] = f"{strings[store.subject[row]]}<br>{strings[store.division[row]]}<br>{strings[store.teacher[row]]}"
+        logger.debug("Processing %d entries for labs on %s. Checking prefix '%s'...", len(store), selected_day, LAB_PREFIX_CHECK)
+        logger.debug("Found %d raw entries matching prefix criteria for %s.", len(labs_today), selected_day)
     
     final_scheduled_labs = []
     processed_sessions = set()
-    for entry in labs_today:
-        session_key = (entry.get('subject'), entry.get('division'), entry.get('room'), entry.get('teacher', ''))
+    for row in labs_today:
+        session_key = (store.subject[row], store.division[row], store.room[row], store.teacher[row])
         if session_key not in processed_sessions:
-            lab_slot_2hr = _get_lab_slot_string(entry.get('time'))
-            if lab_slot_2hr:
+            lab_slot = store.lab_slot_idx[row]
+            if lab_slot >= 0:
                 lab_info = {
-                    'subject': entry.get('subject', 'N/A'), 'division': entry.get('division', 'N/A'),
-                    'room': entry.get('room', 'N/A'), 'teacher': entry.get('teacher', 'N/A'),
-                    'time': lab_slot_2hr
+                    'subject': strings[store.subject[row]], 'division': strings[store.division[row]],
+                    'room': strings[store.room[row]], 'teacher': strings[store.teacher[row]],
+                    'time': LAB_TIME_SLOTS[lab_slot]
                 }
                 final_scheduled_labs.append(lab_info)
                 processed_sessions.add(session_key)
-    print(f"Created {len(final_scheduled_labs)} final unique lab entries with merged time.")
+    logger.debug("Created %d final unique lab entries with merged time.", len(final_scheduled_labs))
 
     final_scheduled_labs.sort(key=sort_key_by_time)
     
-    final_classroom_grid = {t: dict(g) for t, g in classroom_grid.items()}
-    print(f"Returning grid and {len(final_scheduled_labs)} sorted labs.")
+    final_classroom_grid = _finish_grid(classroom_grid)
+    logger.debug("Returning grid and %d sorted labs.", len(final_scheduled_labs))
     return final_classroom_grid, final_scheduled_labs
 
-def build_subject_grid(selected_subject):
+def build_subject_grid(selected_subject, snapshot=None):
+    snapshot = snapshot or current_snapshot()
     grid_data = {time: defaultdict(list) for time in TIME_SLOTS}
+    final_grid = _empty_grid(TIME_SLOTS)
+    if not snapshot.schedule: return _finish_grid(final_grid)
+    store = snapshot.schedule
+    strings = store.strings
     
-    if SCHEDULE_DATA:
-        for entry in SCHEDULE_DATA:
-            if all(k in entry for k in ['subject', 'time', 'day', 'division', 'room']):
-                if entry['subject'] == selected_subject and entry['time'] in grid_data:
-                    if entry['day'] in DAYS_ORDER:
-                        grid_data[entry['time']][entry['day']].append(entry)
-
-    final_grid = {time: defaultdict(lambda: 'Free') for time in TIME_SLOTS}
+    for row in snapshot.index.for_subject(selected_subject):
+        slot, day = store.slot_idx[row], store.day_idx[row]
+        if slot >= 0 and day >= 0:
+            grid_data[TIME_SLOTS[slot]][DAYS_ORDER[day]].append(row)
+
     for time, days in grid_data.items():
-        for day, entries in days.items():
-            count = len(entries)
+        for day, rows in days.items():
+            count = len(rows)
             
             if count == 0:
                 continue 
             
             elif count == 1:
-                entry = entries[0]
-                teacher = entry.get('teacher', 'N/A').strip() or 'N/A'
-                final_grid[time][day] = f"{entry['division']}<br>{entry['room']}<br>{teacher}"
+                row = rows[0]
+                teacher = strings[store.teacher[row]] or 'N/A'
+                final_grid[time][day] = f"{strings[store.division[row]]}<br>{strings[store.room[row]]}<br>{teacher}"
             
             else:
                 html_output = '<div class="multi-class-container">'
-                for entry in entries:
-                    teacher = entry.get('teacher', 'N/A').strip() or 'N/A'
-                    html_output += f'<span class="multi-class-item">{entry["division"]}, {entry["room"]} ({teacher})</span>'
+                for row in rows:
+                    teacher = strings[store.teacher[row]] or 'N/A'
+                    html_output += f'<span class="multi-class-item">{strings[store.division[row]]}, {strings[store.room[row]]} ({teacher})</span>'
                 html_output += '</div>'
                 final_grid[time][day] = html_output
 
-    return {t: dict(g) for t, g in final_grid.items()}
-
-def build_teacher_grid(selected_teacher):
-    grid = {time: defaultdict(lambda: 'Free') for time in TIME_SLOTS}
-    if not SCHEDULE_DATA: return {t: dict(g) for t, g in grid.items()}
-    for entry in SCHEDULE_DATA:
-         if all(k in entry for k in ['teacher', 'time', 'day', 'subject', 'division', 'room']):
-             if entry['teacher'] == selected_teacher and entry['time'] in grid:
-                    if entry['day'] in DAYS_ORDER:
-                        current_content = grid[entry['time']][entry['day']]
-                        new_content = f"{entry['subject']}<br>{entry['division']}<br>{entry['room']}"
-                        if current_content == 'Free':
-                            grid[entry['time']][entry['day']] = new_content
-                        else:
-                            grid[entry['time']][entry['day']] += f"<hr>{new_content}"
-    return {t: dict(g) for t, g in grid.items()}
+    return _finish_grid(final_grid)
 
-def build_labs_grid(selected_lab_subject):
+def build_teacher_grid(selected_teacher, snapshot=None):
+    snapshot = snapshot or current_snapshot()
+    grid = _empty_grid(TIME_SLOTS)
+    if not snapshot.schedule: return _finish_grid(grid)
+    store = snapshot.schedule
+    strings = store.strings
+    for row in snapshot.index.for_teacher(selected_teacher):
+        slot, day = store.slot_idx[row], store.day_idx[row]
+        if slot >= 0 and day >= 0:
+            cells = grid[TIME_SLOTS[slot]]
+            day_name = DAYS_ORDER[day]
+            new_content = f"{strings[store.subject[row]]}<br>{strings[store.division[row]]}<br>{strings[store.room[row]]}"
+            if day_name not in cells:
+                cells[day_name] = new_content
+            else:
+                cells[day_name] += f"<hr>{new_content}"
+    return _finish_grid(grid)
+
+def build_labs_grid(selected_lab_subject, snapshot=None):
+    snapshot = snapshot or current_snapshot()
     grid_data = {time: defaultdict(list) for time in LAB_TIME_SLOTS}
     
-    if not SCHEDULE_DATA or not selected_lab_subject:
-        return {t: dict(g) for t, g in grid_data.items()}
+    if not snapshot.schedule or not selected_lab_subject:
+        return _finish_grid(grid_data)
 
-    # Uses the global helper function now
-    _get_lab_slot_string = get_lab_slot_string
+    store = snapshot.schedule
+    strings = store.strings
+    for row in snapshot.index.for_lab_subject(selected_lab_subject):
+        lab_slot, day = store.lab_slot_idx[row], store.day_idx[row]
+        if lab_slot >= 0 and day >= 0:
+            grid_data[LAB_TIME_SLOTS[lab_slot]][DAYS_ORDER[day]].append(row)
 
-    for entry in SCHEDULE_DATA:
-        essential_lab_keys = ['subject', 'time', 'day', 'division', 'room']
-        if all(k in entry and entry[k] for k in essential_lab_keys):
-            subject_name = entry.get('subject', '').strip()
-            
-            if subject_name.upper().startswith(LAB_PREFIX_CHECK):
-                parts = subject_name.split('-', 1)
-                if len(parts) > 1:
-                    current_lab_subject_raw = parts[1].strip()
-                    current_lab_subject_clean = current_lab_subject_raw.split('(', 1)[0].strip()
-                    
-                    if current_lab_subject_clean != selected_lab_subject:
-                        continue
-                else:
-                    continue
-
-                lab_slot_2hr = _get_lab_slot_string(entry.get('time'))
-                if lab_slot_2hr and lab_slot_2hr in grid_data:
-                    if entry['day'] in DAYS_ORDER:
-                        grid_data[lab_slot_2hr][entry['day']].append(entry)
-
-    final_grid = {time: defaultdict(lambda: 'Free') for time in LAB_TIME_SLOTS}
+    final_grid = _empty_grid(LAB_TIME_SLOTS)
     placed_labs = set() 
 
     for time, days in grid_data.items():
-        for day, entries in days.items():
-            count = len(entries)
-            if count == 0:
+        for day, rows in days.items():
+            if not rows:
                 continue
             
             unique_sessions_in_slot = {}
-            for entry in entries:
-                session_key = (entry['subject'], entry['division'], entry['room'])
+            for row in rows:
+                session_key = (store.subject[row], store.division[row], store.room[row])
                 if session_key not in placed_labs:
-                    unique_sessions_in_slot[session_key] = entry
+                    unique_sessions_in_slot[session_key] = row
                     placed_labs.add(session_key) 
             
-            final_entries = list(unique_sessions_in_slot.values())
-            final_count = len(final_entries)
+            final_rows = list(unique_sessions_in_slot.values())
+            final_count = len(final_rows)
 
             if final_count == 0:
                 continue
 
             elif final_count == 1:
-                entry = final_entries[0]
-                teacher = entry.get('teacher', 'N/A').strip() or 'N/A'
-                final_grid[time][day] = f"{entry['subject']}<br>{entry['division']}<br>{entry['room']}<br>{teacher}"
+                row = final_rows[0]
+                teacher = strings[store.teacher[row]] or 'N/A'
+                final_grid[time][day] = f"{strings[store.subject[row]]}<br>{strings[store.division[row]]}<br>{strings[store.room[row]]}<br>{teacher}"
 
             else:
                 html_output = '<div class="multi-class-container">'
-                for entry in final_entries:
-                    teacher = entry.get('teacher', 'N/A').strip() or 'N/A'
-                    html_output += f'<span class="multi-class-item">{entry["subject"]}, {entry["division"]}, {entry["room"]}</span>'
+                for row in final_rows:
+                    html_output += f'<span class="multi-class-item">{strings[store.subject[row]]}, {strings[store.division[row]]}, {strings[store.room[row]]}</span>'
                 html_output += '</div>'
                 final_grid[time][day] = html_output
 
-    return {t: dict(g) for t, g in final_grid.items()}
+    return _finish_grid(final_grid)
+
+def build_personal_grid(selected_division, selected_batch=None, snapshot=None):
+    """One division's week in a single pass over its index bucket: theory on TIME_SLOTS, and on
+    LAB_TIME_SLOTS the labs of `selected_batch`. Tutorials of other batches are left out; with no
+    batch, every batch is shown. A sub-batch ('Batch 1A') also gets the labs and tutorials of its
+    whole batch ('Batch 1'). Returns (grid, lab_grid)."""
+    snapshot = snapshot or current_snapshot()
+    grid = _empty_grid(TIME_SLOTS)
+    lab_grid = _empty_grid(LAB_TIME_SLOTS)
+    if not snapshot.schedule or not selected_division:
+        return _finish_grid(grid), _finish_grid(lab_grid)
+    store = snapshot.schedule
+    strings = store.strings
+
+    wanted_batches = {selected_batch, get_parent_batch(selected_batch)} - {None}
+    batches = {} # subject code -> get_lab_batch() for labs, get_tutorial_batch() otherwise
+    lab_sessions = {} # (lab slot, day) -> {(subject, room): row}, one entry per 2-hour session
+    for row in snapshot.index.for_division(selected_division):
+        day = store.day_idx[row]
+        if day < 0:
+            continue
+        subject_code = store.subject[row]
+        if subject_code not in batches:
+            subject = strings[subject_code]
+            batches[subject_code] = get_lab_batch(subject) if store.is_lab[row] else get_tutorial_batch(subject)
+        batch = batches[subject_code]
+        if wanted_batches and batch is not None and batch not in wanted_batches:
+            continue
+        if store.is_lab[row]:
+            lab_slot = store.lab_slot_idx[row]
+            if lab_slot >= 0:
+                lab_sessions.setdefault((lab_slot, day), {}).setdefault((subject_code, store.room[row]), row)
+            continue
+        slot = store.slot_idx[row]
+        if slot >= 0:
+            cells = grid[TIME_SLOTS[slot]]
+            day_name = DAYS_ORDER[day]
+            teacher = strings[store.teacher[row]] or 'N/A'
+            new_content = f"{strings[store.subject[row]]}<br>{strings[store.room[row]]}<br>{teacher}"
+            if day_name not in cells:
+                cells[day_name] = new_content
+            else:
+                cells[day_name] += f"<hr>{new_content}"
+
+    for (lab_slot, day), sessions in lab_sessions.items():
+        rows = list(sessions.values())
+        if len(rows) == 1:
+            row = rows[0]
+            teacher = strings[store.teacher[row]] or 'N/A'
+            content = f"{strings[store.subject[row]]}<br>{strings[store.room[row]]}<br>{teacher}"
+        else:
+            content = '<div class="multi-class-container">'
+            for row in rows:
+                content += f'<span class="multi-class-item">{strings[store.subject[row]]}, {strings[store.room[row]]}</span>'
+            content += '</div>'
+        lab_grid[LAB_TIME_SLOTS[lab_slot]][DAYS_ORDER[day]] = content
+
+    return _finish_grid(grid), _finish_grid(lab_grid)
+
+
+# --- FREE ROOM FINDER ---
+ALL_SLOTS_MASK = (1 << len(TIME_SLOTS)) - 1
+
+def get_room_occupancy(snapshot=None):
+    """{room: [busy bitmask per day in DAYS_ORDER]} for every room in snapshot.classrooms.
+
+    Bit i of a mask is set when TIME_SLOTS[i] is taken; labs mark both
+    hours of their 2-hour block. Built on first use and kept on the snapshot.
+    """
+    return (snapshot or current_snapshot()).derived('room_occupancy', _build_room_occupancy)
+
+def _build_room_occupancy(snapshot):
+    occupancy = {room: [0] * len(DAYS_ORDER) for room in snapshot.classrooms}
+    store = snapshot.schedule
+    if store:
+        for room in snapshot.classrooms:
+            theory, labs = _day_masks(store, snapshot.index.for_room(room))
+            occupancy[room] = [a | b for a, b in zip(theory, labs)]
+    return occupancy
+
+def _day_masks(store, rows):
+    """([theory mask per day], [lab mask per day]) of the TIME_SLOTS bits taken by `rows`.
+
+    Labs mark both hours of their 2-hour block.
+    """
+    theory = [0] * len(DAYS_ORDER)
+    labs = [0] * len(DAYS_ORDER)
+    for row in rows:
+        day = store.day_idx[row]
+        if day < 0:
+            continue
+        if store.is_lab[row]:
+            lab_slot = store.lab_slot_idx[row]
+            if lab_slot >= 0:
+                labs[day] |= LAB_SLOT_MASKS[lab_slot]
+        elif store.slot_idx[row] >= 0:
+            theory[day] |= 1 << store.slot_idx[row]
+    return theory, labs
+
+def _free_windows(free_mask, min_length):
+    """Maximal runs of set bits in `free_mask` at least `min_length` long, as (first, last) slot indices."""
+    windows = []
+    i = 0
+    while free_mask >> i:
+        if (free_mask >> i) & 1:
+            start = i
+            while (free_mask >> i) & 1:
+                i += 1
+            if i - start >= min_length:
+                windows.append((start, i - 1))
+        else:
+            i += 1
+    return windows
+
+def find_free_rooms(selected_day, first_slot, last_slot, min_length=None, prefix='', snapshot=None):
+    """Rooms free on `selected_day` between TIME_SLOTS indices `first_slot`..`last_slot` (inclusive).
+
+    Without `min_length` a room must be free for the whole range; with it, the
+    room needs at least one run of `min_length` consecutive free slots in range.
+    Each result lists the room's free windows inside the range.
+    """
+    snapshot = snapshot or current_snapshot()
+    day = DAY_INDEX[selected_day]
+    range_mask = ((1 << (last_slot + 1)) - 1) & ~((1 << first_slot) - 1)
+    span = last_slot - first_slot + 1
+    min_length = span if min_length is None else min_length
+    prefix = (prefix or '').upper()
+
+    free_rooms = []
+    for room, masks in get_room_occupancy(snapshot).items():
+        if prefix and not room.upper().startswith(prefix):
+            continue
+        free = ~masks[day] & range_mask
+        # After shifting-and-ANDing k-1 times, bit i survives only if slots i..i+k-1 are all free.
+        runs = free
+        for _ in range(min_length - 1):
+            runs &= runs >> 1
+        if not runs:
+            continue
+        free_rooms.append({
+            'room': room,
+            'windows': [
+                {'time': f"{TIME_SLOTS[a].split('-')[0]}-{TIME_SLOTS[b].split('-')[1]}", 'slots': b - a + 1}
+                for a, b in _free_windows(free, min_length)
+            ],
+        })
+    return free_rooms
+
+
+# --- CONFLICT DETECTION ---
+def _describe_row(store, row):
+    strings = store.strings
+    return {
+        'subject': strings[store.subject[row]],
+        'division': strings[store.division[row]],
+        'room': strings[store.room[row]],
+        'teacher': strings[store.teacher[row]] or 'N/A',
+        'time': strings[store.time[row]],
+    }
+
+def _describe_class(store, rows):
+    """_describe_row of one class held in `rows`, with every division it is taught to."""
+    described = _describe_row(store, rows[0])
+    described['division'] = ', '.join(dict.fromkeys(store.strings[store.division[row]] for row in rows))
+    return described
+
+def find_conflicts(snapshot=None):
+    """Every room double-booking, teacher double-booking and division overlap in one pass.
+
+    Each row is expanded to the hourly slots it occupies and dropped into
+    hash buckets keyed by (day, slot, room), (day, slot, teacher) and (day,
+    slot, division). Labs are normally listed one row per hour; a lab row
+    whose time is a whole 2-hour block is expanded to both hours.
+
+    For rooms and teachers a class is its (subject, room, teacher): one
+    class taught to several divisions together is listed once with all of
+    them, and only different classes meeting in one bucket are a clash.
+
+    For divisions, lab and tutorial batches run in parallel by design, so
+    only a theory class overlapping anything else, one batch of one lab
+    booked twice, or a tutorial overlapping anything else of its own batch
+    is reported, with just the classes that clash. IGNORED_ROOMS are
+    placeholders and are not checked for room clashes.
+    """
+    snapshot = snapshot or current_snapshot()
+    store = snapshot.schedule
+    result = {'room_conflicts': [], 'teacher_conflicts': [], 'division_conflicts': []}
+    if not store:
+        result['summary'] = {k: 0 for k in result}
+        return result
+
+    strings = store.strings
+    by_room = defaultdict(dict)
+    by_teacher = defaultdict(dict)
+    by_division = defaultdict(dict)
+    batch_cache = {} # subject code -> ('lab', lab subject, batch), ('tutorial', batch), or None for theory
+    division_cache = {}
+
+    for row in range(len(store)):
+        day = store.day_idx[row]
+        if day < 0:
+            continue
+        if store.slot_idx[row] >= 0:
+            mask = 1 << store.slot_idx[row]
+        elif store.is_lab[row] and store.lab_slot_idx[row] >= 0:
+            mask = LAB_SLOT_MASKS[store.lab_slot_idx[row]]
+        else:
+            continue
+        occupant = (store.subject[row], store.division[row], store.room[row], store.teacher[row])
+        shared_class = (store.subject[row], store.room[row], store.teacher[row])
+
+        subject_code = store.subject[row]
+        if subject_code not in batch_cache:
+            if store.is_lab[row]:
+                batch = get_lab_batch(strings[subject_code])
+                batch_cache[subject_code] = ('lab', store.lab_subject[row], batch) if batch else None
+            else:
+                batch = get_tutorial_batch(strings[subject_code])
+                batch_cache[subject_code] = ('tutorial', batch) if batch else None
+        batch = batch_cache[subject_code]
+        division_code = store.division[row]
+        if division_code not in division_cache:
+            division_cache[division_code] = split_divisions(strings[division_code])
+        room = strings[store.room[row]]
+        teacher_code = store.teacher[row]
+
+        slot = 0
+        while mask:
+            if mask & 1:
+                # Occupants keep their CSV order; a shared class collects the rows of all its divisions.
+                if room not in IGNORED_ROOMS:
+                    by_room[(day, slot, store.room[row])].setdefault(shared_class, []).append(row)
+                if teacher_code:
+                    by_teacher[(day, slot, teacher_code)].setdefault(shared_class, []).append(row)
+                for division in division_cache[division_code]:
+                    by_division[(day, slot, division)].setdefault(occupant, (row, batch))
+            mask >>= 1
+            slot += 1
+
+    def report(buckets, label, decode):
+        conflicts = []
+        for (day, slot, key), occupants in buckets.items():
+            if len(occupants) > 1:
+                conflicts.append({
+                    'day': DAYS_ORDER[day],
+                    'time': TIME_SLOTS[slot],
+                    label: decode(key),
+                    'classes': [_describe_class(store, rows) for rows in occupants.values()],
+                })
+        conflicts.sort(key=lambda c: (DAY_INDEX[c['day']], SLOT_INDEX[c['time']], c[label]))
+        return conflicts
+
+    result['room_conflicts'] = report(by_room, 'room', strings.__getitem__)
+    result['teacher_conflicts'] = report(by_teacher, 'teacher', strings.__getitem__)
+
+    # Parallel batches are expected; only theory-vs-anything, one (lab, batch) booked twice,
+    # or a tutorial meeting anything else of its batch clash.
+    division_overlaps = {}
+    for key, occupants in by_division.items():
+        if len(occupants) < 2:
+            continue
+        if any(batch is None for _, batch in occupants.values()):
+            clashing = [row for row, _ in occupants.values()]
+        else:
+            labs = defaultdict(list)
+            batches = defaultdict(list)
+            for row, batch in occupants.values():
+                if batch[0] == 'lab':
+                    labs[batch].append(row)
+                batches[batch[-1]].append((row, batch[0]))
+            clashing = set(row for rows in labs.values() if len(rows) > 1 for row in rows)
+            clashing.update(row for rows in batches.values()
+                            if len(rows) > 1 and any(kind == 'tutorial' for _, kind in rows) for row, _ in rows)
+            clashing = [row for row, _ in occupants.values() if row in clashing]
+        if clashing:
+            division_overlaps[key] = {i: [row] for i, row in enumerate(clashing)}
+    result['division_conflicts'] = report(division_overlaps, 'division', lambda division: division)
+
+    result['summary'] = {name: len(conflicts) for name, conflicts in result.items()}
+    return result
+
+
+# --- UTILISATION ANALYTICS ---
+# Every room and teacher is reduced to one busy bitmask per day (the rows of
+# its day x slot occupancy matrix). A day mask has only 2**len(TIME_SLOTS)
+# possible values, so hours and idle gaps are looked up per mask from a
+# table built at import, and the heatmaps add up each distinct mask once
+# however many rooms or teachers share it.
+SLOTS_PER_WEEK = len(DAYS_ORDER) * len(TIME_SLOTS)
+PEAK_SLOTS_SHOWN = 5
+
+def _mask_stats(mask):
+    """(busy slots, idle gap slots, idle gaps, longest idle gap) of one day's busy mask.
+
+    An idle gap is a run of free slots with busy slots on both sides of it.
+    """
+    if not mask:
+        return 0, 0, 0, 0
+    first, last = (mask & -mask).bit_length() - 1, mask.bit_length() - 1
+    span = (1 << (last + 1)) - (1 << first)
+    gaps = [b - a + 1 for a, b in _free_windows(~mask & span, 1)]
+    return bin(mask).count('1'), sum(gaps), len(gaps), max(gaps, default=0)
+
+MASK_STATS_TABLE = [_mask_stats(mask) for mask in range(ALL_SLOTS_MASK + 1)]
+
+def _usage(busy_masks):
+    """Weekly hours and idle-gap figures of one room or teacher from its per-day busy masks."""
+    stats = [MASK_STATS_TABLE[mask] for mask in busy_masks]
+    return {
+        'hours': sum(s[0] for s in stats),
+        'hours_by_day': [s[0] for s in stats],
+        'idle_gaps': sum(s[2] for s in stats),
+        'idle_gap_hours': sum(s[1] for s in stats),
+        'longest_idle_gap': max(s[3] for s in stats),
+    }
+
+def _heatmap(busy_masks):
+    """[[how many of `busy_masks` are busy in each TIME_SLOTS slot] for each day in DAYS_ORDER]."""
+    heatmap = []
+    for day in range(len(DAYS_ORDER)):
+        counts = [0] * len(TIME_SLOTS)
+        for mask, n in Counter(masks[day] for masks in busy_masks).items():
+            slot = 0
+            while mask:
+                if mask & 1:
+                    counts[slot] += n
+                mask >>= 1
+                slot += 1
+        heatmap.append(counts)
+    return heatmap
+
+def _mean(values):
+    return round(sum(values) / len(values), 1) if values else 0
+
+def get_utilisation(snapshot=None):
+    """Room occupancy, teacher load, peak-slot heatmaps and idle gaps for a whole timetable.
+
+    Rooms are every room with classes except IGNORED_ROOMS, lab rooms
+    included; occupancy is the share of the SLOTS_PER_WEEK hourly slots in
+    which a room is in use. Teacher hours count each hour a teacher is
+    busy once, a lab being its 2-hour block. Built on first use and kept
+    on the snapshot.
+    """
+    return (snapshot or current_snapshot()).derived('utilisation', _build_utilisation)
+
+def _build_utilisation(snapshot):
+    store = snapshot.schedule
+    room_masks = {}
+    teacher_masks = {}
+    rooms = {}
+    teachers = {}
+    if store:
+        for room in sorted(snapshot.index.by_room):
+            if not room or room in IGNORED_ROOMS:
+                continue
+            theory, labs = _day_masks(store, snapshot.index.for_room(room))
+            busy = room_masks[room] = [a | b for a, b in zip(theory, labs)]
+            usage = _usage(busy)
+            rooms[room] = {
+                'occupancy': round(usage['hours'] * 100 / SLOTS_PER_WEEK, 1),
+                **usage,
+                'lab_hours': sum(MASK_STATS_TABLE[mask][0] for mask in labs),
+                'classroom': room in snapshot.classroom_set,
+            }
+        for teacher in snapshot.teachers:
+            theory, labs = _day_masks(store, snapshot.index.for_teacher(teacher))
+            busy = teacher_masks[teacher] = [a | b for a, b in zip(theory, labs)]
+            usage = _usage(busy)
+            lab_hours = sum(MASK_STATS_TABLE[mask][0] for mask in labs)
+            teachers[teacher] = {
+                **usage,
+                'theory_hours': usage['hours'] - lab_hours,
+                'lab_hours': lab_hours,
+                'days_taught': sum(1 for mask in busy if mask),
+            }
+
+    room_heatmap = _heatmap(room_masks.values())
+    teacher_heatmap = _heatmap(teacher_masks.values())
+    peak_slots = heapq.nlargest(PEAK_SLOTS_SHOWN, (
+        (room_heatmap[day][slot], teacher_heatmap[day][slot], -day, -slot)
+        for day in range(len(DAYS_ORDER)) for slot in range(len(TIME_SLOTS))
+    ))
+    teacher_hours = [usage['hours'] for usage in teachers.values()]
+    utilisation = {
+        'days': DAYS_ORDER,
+        'time_slots': TIME_SLOTS,
+        'summary': {
+            'rooms': len(rooms),
+            'teachers': len(teachers),
+            'slots_per_week': SLOTS_PER_WEEK,
+            'mean_room_occupancy': _mean([usage['occupancy'] for usage in rooms.values()]),
+            'mean_teacher_hours': _mean(teacher_hours),
+            'max_teacher_hours': max(teacher_hours, default=0),
+            'teacher_idle_gap_hours': sum(usage['idle_gap_hours'] for usage in teachers.values()),
+        },
+        'heatmap': {'rooms_in_use': room_heatmap, 'teachers_busy': teacher_heatmap},
+        'peak_slots': [
+            {'day': DAYS_ORDER[-day], 'time': TIME_SLOTS[-slot], 'rooms_in_use': rooms_in_use, 'teachers_busy': teachers_busy}
+            for rooms_in_use, teachers_busy, day, slot in peak_slots if rooms_in_use
+        ],
+        'rooms': rooms,
+        'teachers': teachers,
+    }
+    return utilisation
+
+
+# --- SNAPSHOT DIFF ---
+DIFF_FIELDS = ('subject', 'division', 'day', 'time', 'room', 'teacher')
+
+def _class_keys(snapshot):
+    """One DIFF_FIELDS tuple per row, in CSV order."""
+    store = snapshot.schedule
+    strings = store.strings
+    columns = [getattr(store, field) for field in DIFF_FIELDS]
+    return [tuple(strings[code] for code in codes) for codes in zip(*columns)]
+
+def _as_class(key):
+    return dict(zip(DIFF_FIELDS, key))
+
+def _without(keys, dropped):
+    """`keys` minus one occurrence per count in the Counter `dropped`, order kept."""
+    remaining = Counter(dropped)
+    for key in keys:
+        if remaining[key]:
+            remaining[key] -= 1
+            continue
+        yield key
+
+class SnapshotDiff:
+    """Classes added, removed and moved between two snapshots, and which cached responses that touches.
+
+    Rows are compared as a multiset of DIFF_FIELDS keys. A removed and an
+    added class with the same subject, division and teacher are reported as
+    one move. Grid bodies list a cell's classes in CSV order, so when the
+    rows both snapshots share are not in the same order, every cached
+    response counts as affected.
+    """
+
+    # Response cache key kind -> the affected-entity set its second element is checked against
+    KEYED_BY = {'classroom': 'rooms', 'teacher': 'teachers', 'subject': 'subjects', 'labs': 'lab_subjects',
+                'personal': 'divisions'}
+
+    def __init__(self, old, new):
+        self.old_version = old.version
+        self.new_version = new.version
+        self.comparable = bool(old.schedule) and bool(new.schedule)
+        self.lists_changed = sorted(name for name in ScheduleSnapshot.ENTITY_LISTS
+                                    if getattr(old, name) != getattr(new, name))
+        old_keys = _class_keys(old) if old.schedule else []
+        new_keys = _class_keys(new) if new.schedule else []
+        old_counts, new_counts = Counter(old_keys), Counter(new_keys)
+        removed = old_counts - new_counts
+        added = new_counts - old_counts
+        self.unchanged = len(old_keys) - sum(removed.values())
+        self.reordered = any(a != b for a, b in zip(_without(old_keys, removed), _without(new_keys, added)))
+
+        # Pair removals and additions of the same class into moves.
+        vacated = defaultdict(list)
+        for key in sorted(removed.elements()):
+            vacated[(key[0], key[1], key[5])].append(key)
+        self.moved = []
+        self.added = []
+        for key in sorted(added.elements()):
+            sources = vacated.get((key[0], key[1], key[5]))
+            if sources:
+                self.moved.append((sources.pop(0), key))
+            else:
+                self.added.append(key)
+        self.removed = [key for keys in vacated.values() for key in keys]
+        self.removed.sort()
+
+        self.rooms, self.teachers, self.subjects, self.lab_subjects = set(), set(), set(), set()
+        self.divisions, self.days, self.day_slots = set(), set(), set()
+        for key in self._changed_keys():
+            self._mark_affected(key)
+
+    def _changed_keys(self):
+        yield from self.added
+        yield from self.removed
+        for before, after in self.moved:
+            yield before
+            yield after
+
+    def _mark_affected(self, key):
+        subject, division, day, time_slot, room, teacher = key
+        is_lab, lab_subject = classify_subject(subject)
+        self.subjects.add(subject)
+        self.rooms.add(room)
+        self.teachers.add(teacher)
+        self.divisions.update(split_divisions(division))
+        self.days.add(day)
+        if lab_subject:
+            self.lab_subjects.add(lab_subject)
+        if is_lab:
+            lab_slot = LAB_SLOT_INDEX.get(get_lab_slot_string(time_slot), -1)
+            mask = LAB_SLOT_MASKS[lab_slot] if lab_slot >= 0 else 0
+        else:
+            mask = 1 << SLOT_INDEX[time_slot] if time_slot in SLOT_INDEX else 0
+        self.day_slots.update((day, slot) for i, slot in enumerate(TIME_SLOTS) if mask >> i & 1)
+
+    @property
+    def changed(self):
+        return bool(self.added or self.removed or self.moved)
+
+    def affects(self, key):
+        """Whether the cached response for `key` may differ between the two snapshots."""
+        if not self.comparable or self.reordered:
+            return True
+        kind = key[0]
+        if kind in self.KEYED_BY:
+            return key[1] in getattr(self, self.KEYED_BY[kind])
+        if kind in ('day', 'free_rooms'): # Their columns are the classroom list
+            return key[1] in self.days or 'classrooms' in self.lists_changed
+        if kind == 'live':
+            return (key[1], key[2]) in self.day_slots
+        if kind in ('conflicts', 'utilisation'): # Whole-timetable reports
+            return self.changed
+        return True # Anything else (batches, diffs, ...) is rebuilt
+
+    def summary(self):
+        return {
+            'old_version': self.old_version,
+            'new_version': self.new_version,
+            'added': len(self.added),
+            'removed': len(self.removed),
+            'moved': len(self.moved),
+            'unchanged': self.unchanged,
+            'reordered': self.reordered,
+            'lists_changed': self.lists_changed,
+        }
+
+    def _by(self, entities_of):
+        """{entity: {'added', 'removed', 'moved'}} for the entities `entities_of(key)` returns."""
+        counts = defaultdict(lambda: {'added': 0, 'removed': 0, 'moved': 0})
+        for change, keys in (('added', self.added), ('removed', self.removed)):
+            for key in keys:
+                for entity in entities_of(key):
+                    counts[entity][change] += 1
+        for before, after in self.moved:
+            for entity in set(entities_of(before)) | set(entities_of(after)):
+                counts[entity]['moved'] += 1
+        return dict(sorted(counts.items()))
+
+    def to_dict(self, limit=None):
+        """The summary plus every change (at most `limit` of each kind) and per-entity counts."""
+        return {
+            **self.summary(),
+            'changes': {
+                'added': [_as_class(key) for key in self.added[:limit]],
+                'removed': [_as_class(key) for key in self.removed[:limit]],
+                'moved': [{'from': _as_class(before), 'to': _as_class(after)} for before, after in self.moved[:limit]],
+            },
+            'by_room': self._by(lambda key: [key[4]]),
+            'by_teacher': self._by(lambda key: [key[5]] if key[5] else []),
+            'by_division': self._by(lambda key: split_divisions(key[1])),
+        }
+
+
+# --- SEARCH INDEX ---
+SEARCH_KINDS = { # /search kind -> ScheduleSnapshot entity list
+    'subject': 'subjects',
+    'lab_subject': 'lab_subjects',
+    'teacher': 'teachers',
+    'classroom': 'classrooms',
+    'division': 'divisions',
+}
+SEARCH_STOPWORDS = frozenset(('and', 'of', 'for', 'the', 'in', 'to'))
+
+def _search_words(text):
+    """'BEE- Basic Electrical Engg' -> ['bee', 'basic', 'electrical', 'engg']"""
+    return ''.join(ch if ch.isalnum() else ' ' for ch in text.lower()).split()
+
+def _trigrams(text):
+    padded = f" {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def _initials(words):
+    """Initials of all words, of the words minus stopwords, and of the words after a leading code."""
+    variants = {''.join(word[0] for word in words),
+                ''.join(word[0] for word in words if word not in SEARCH_STOPWORDS)}
+    if len(words) > 2:
+        variants.add(''.join(word[0] for word in words[1:] if word not in SEARCH_STOPWORDS))
+    return {initials for initials in variants if len(initials) > 1}
+
+class PrefixIndex:
+    """Sorted match keys of one kind and key type, answering "best-ranked entries whose key starts with X".
+
+    A prefix covers one contiguous run of keys. Within every BLOCK keys the
+    entry ranks are also stored presorted, so the run's best entries come
+    from lazily merging the blocks it spans instead of sorting every match.
+    """
+
+    BLOCK = 64
+
+    def __init__(self, keys):
+        keys.sort() # (key, entry rank)
+        self.keys = [key for key, _ in keys]
+        self.ranks = array('I', [rank for _, rank in keys])
+        self.block_ranks = array('I')
+        for start in range(0, len(keys), self.BLOCK):
+            self.block_ranks.extend(sorted(self.ranks[start:start + self.BLOCK]))
+
+    def bounds(self, text):
+        """(lo, mid, hi): keys[lo:mid] equal `text`, keys[mid:hi] merely start with it."""
+        lo = bisect_left(self.keys, text)
+        mid = bisect_right(self.keys, text, lo)
+        hi = bisect_left(self.keys, text + '\U0010ffff', mid)
+        return lo, mid, hi
+
+    def ranked(self, lo, hi):
+        """Entry ranks of keys[lo:hi], best first."""
+        block = self.BLOCK
+        first, last = -(-lo // block) * block, hi // block * block
+        if last - first < 2 * block:
+            return iter(sorted(self.ranks[lo:hi]))
+        streams = [sorted(self.ranks[lo:first]), sorted(self.ranks[last:hi])]
+        streams.extend(self.block_ranks[start:start + block] for start in range(first, last, block))
+        return heapq.merge(*streams)
+
+
+class SearchIndex:
+    """Ranked typeahead over every entity name of one snapshot.
+
+    Each name is indexed under three key types: the whole name, each of
+    its words, and the initials of its words, so abbreviations work
+    ('bee' finds 'BEE- Basic Electrical Engg', 'dtil' finds 'Design Thunking
+    and Idea Lab', 'aak' finds 'A. A. Kulkarni'). Entries are numbered in
+    ranking order (shorter names first), so ties between equally good
+    matches are broken by that number alone. Queries of three or more
+    characters that leave room in the result list fall back to trigram
+    similarity, which catches typos and mid-word substrings.
+    """
+
+    KEY_SCORES = {'name': (90, 100), 'word': (70, 80), 'initials': (60, 75)} # (prefix, exact) score
+    FUZZY_SCORE = 50 # Scaled by trigram similarity
+    FUZZY_MIN_SIMILARITY = 0.4
+
+    def __init__(self, snapshot):
+        entries = sorted(((value, kind) for kind, list_name in SEARCH_KINDS.items()
+                          for value in getattr(snapshot, list_name) if _search_words(value)),
+                         key=lambda entry: (len(entry[0]), entry[0], entry[1]))
+        self.values = [value for value, _ in entries]
+        self.kinds = [kind for _, kind in entries]
+        self.words = []
+        self.gram_counts = array('H')
+        keys = {kind: {key_type: [] for key_type in self.KEY_SCORES} for kind in SEARCH_KINDS}
+        grams = defaultdict(lambda: array('I'))
+        for rank, (value, kind) in enumerate(entries):
+            words = _search_words(value)
+            name = ' '.join(words)
+            self.words.append(words)
+            kind_keys = keys[kind]
+            kind_keys['name'].append((name, rank))
+            kind_keys['word'].extend((word, rank) for word in set(words))
+            kind_keys['initials'].extend((initials, rank) for initials in _initials(words))
+            name_grams = _trigrams(name)
+            self.gram_counts.append(min(len(name_grams), 0xFFFF))
+            for gram in name_grams:
+                grams[gram].append(rank)
+        self.indexes = {kind: {key_type: PrefixIndex(kind_keys[key_type]) for key_type in self.KEY_SCORES}
+                        for kind, kind_keys in keys.items()}
+        self.grams = dict(grams)
+
+    def _prefix_streams(self, text, kinds):
+        for kind in kinds:
+            for key_type, (prefix_score, exact_score) in self.KEY_SCORES.items():
+                index = self.indexes[kind][key_type]
+                lo, mid, hi = index.bounds(text)
+                if mid > lo:
+                    yield self._scored(index.ranked(lo, mid), exact_score)
+                if hi > mid:
+                    yield self._scored(index.ranked(mid, hi), prefix_score)
+
+    @staticmethod
+    def _scored(ranks, score):
+        """(-score, rank) pairs, so heapq.merge yields the best match first."""
+        for rank in ranks:
+            yield -score, rank
+
+    def _all_words_streams(self, words, kinds):
+        """'basic elec': entries where every query word starts some word of the name."""
+        for kind in kinds:
+            index = self.indexes[kind]['word']
+            # Drive the scan from the query word with the fewest matching keys.
+            spans = [(index.bounds(part), part) for part in words]
+            (lo, _, hi), part = min(spans, key=lambda span: span[0][2] - span[0][0])
+            rest = [other for other in words if other != part]
+            yield self._scored(self._having_words(index.ranked(lo, hi), rest), self.KEY_SCORES['word'][0])
+
+    def _having_words(self, ranks, parts):
+        for rank in ranks:
+            if all(any(word.startswith(part) for word in self.words[rank]) for part in parts):
+                yield rank
+
+    def _fuzzy_matches(self, text, kinds, exclude):
+        query_grams = _trigrams(text)
+        shared = Counter(chain.from_iterable(self.grams.get(gram, ()) for gram in query_grams))
+        matches = []
+        for rank, count in shared.items():
+            similarity = 2 * count / (len(query_grams) + self.gram_counts[rank]) # Dice coefficient
+            if similarity >= self.FUZZY_MIN_SIMILARITY and rank not in exclude and self.kinds[rank] in kinds:
+                matches.append((-int(self.FUZZY_SCORE * similarity), rank))
+        return sorted(matches)
+
+    def search(self, query, kinds=None, limit=SEARCH_LIMIT):
+        """[{'kind', 'value', 'score'}] best first; `kinds` restricts the result to some SEARCH_KINDS."""
+        words = _search_words(query)
+        if not words:
+            return []
+        text = ' '.join(words)
+        kinds = kinds or SEARCH_KINDS
+        streams = list(self._prefix_streams(text, kinds))
+        if len(words) > 1:
+            streams.extend(self._all_words_streams(words, kinds))
+        found = {}
+        for score, rank in heapq.merge(*streams):
+            if rank not in found:
+                found[rank] = -score
+                if len(found) >= limit:
+                    break
+        if len(found) < limit and len(text) >= 3:
+            for score, rank in self._fuzzy_matches(text, kinds, found)[:limit - len(found)]:
+                found[rank] = -score
+        return [{'kind': self.kinds[rank], 'value': self.values[rank], 'score': score}
+                for rank, score in sorted(found.items(), key=lambda item: (-item[1], item[0]))]
+
+def get_search_index(snapshot=None):
+    """The snapshot's SearchIndex, built on first use and kept on the snapshot."""
+    return (snapshot or current_snapshot()).derived('search_index', SearchIndex)
+
+
+# --- GRID VIEWS ---
+# One entry per /get_by_* view, shared by the single-view routes and /get_batch.
+# `valid_values(snapshot)` lists the accepted values; `build_payload(value, snapshot)`
+# returns the JSON-ready dict the route serves.
+GridView = namedtuple('GridView', ['valid_values', 'build_payload', 'error'])
+
+def classroom_view_payload(selected_room, snapshot):
+    grid = build_classroom_grid(selected_room, snapshot)
+    return {'columns': DAYS_ORDER or [], 'rows': TIME_SLOTS or [], 'grid': grid or {}, 'title': f"Schedule for Classroom: {selected_room}"}
+
+def day_view_payload(selected_day, snapshot):
+    classroom_grid, scheduled_labs = build_day_view(selected_day, snapshot)
+    return {'grid_type': 'hybrid_day_view',
+            'columns': snapshot.classrooms or [], 
+            'rows': TIME_SLOTS or [],
+            'classroom_grid': classroom_grid or {},
+            'scheduled_labs': scheduled_labs if isinstance(scheduled_labs, list) else [],
+            'title': f"Schedule for {selected_day}"}
+
+def subject_view_payload(selected_subject, snapshot):
+    grid = build_subject_grid(selected_subject, snapshot)
+    return {'columns': DAYS_ORDER or [], 'rows': TIME_SLOTS or [], 'grid': grid or {}, 'title': f"Schedule for Subject: {selected_subject}"}
+
+def teacher_view_payload(selected_teacher, snapshot):
+    grid = build_teacher_grid(selected_teacher, snapshot)
+    return {'columns': DAYS_ORDER or [], 'rows': TIME_SLOTS or [], 'grid': grid or {}, 'title': f"Schedule for {selected_teacher}"}
+
+def labs_view_payload(selected_lab_subject, snapshot):
+    grid = build_labs_grid(selected_lab_subject, snapshot)
+    return {
+        'grid_type': 'labs_view', 
+        'columns': DAYS_ORDER or [], 
+        'rows': LAB_TIME_SLOTS or [], 
+        'grid': grid or {}, 
+        'title': f"Lab Schedule for {selected_lab_subject}"
+    }
+
+GRID_VIEWS = {
+    'classroom': GridView(lambda snapshot: snapshot.classrooms, classroom_view_payload, 'Please select a valid classroom.'),
+    'day': GridView(lambda snapshot: DAYS_ORDER, day_view_payload, 'Please select a valid day.'),
+    'subject': GridView(lambda snapshot: snapshot.subjects, subject_view_payload, 'Please select a valid subject.'),
+    'teacher': GridView(lambda snapshot: snapshot.teachers, teacher_view_payload, 'Please select a valid teacher.'),
+    'labs': GridView(lambda snapshot: snapshot.lab_subjects, labs_view_payload, 'Please select a valid lab subject.'),
+}
+
+
+# --- COMPACT WIRE FORMAT ---
+# ?format=compact replaces every grid by a rows x columns matrix of codes into one
+# shared `strings` table, and every list of class dicts by {'fields', 'records'}.
+# Code 0 is an empty cell; a cell holding '<br>'-joined lines is a list of codes,
+# one per line. static/script.js (expandCompact) turns it back into the plain payload.
+COMPACT_GRIDS = {'grid': 'rows', 'classroom_grid': 'rows', 'lab_grid': 'lab_rows'} # grid key -> its row labels
+COMPACT_RECORD_LISTS = ('theory_classes', 'lab_classes', 'scheduled_labs')
+
+def compact_payload(payload):
+    strings = [None]
+    codes = {}
+
+    def code(value):
+        found = codes.get(value)
+        if found is None:
+            found = codes[value] = len(strings)
+            strings.append(value)
+        return found
+
+    def cell(value):
+        if value is None:
+            return 0
+        lines = value.split('<br>')
+        return code(value) if len(lines) == 1 else [code(line) for line in lines]
+
+    compact = dict(payload)
+    columns = payload.get('columns') or []
+    for grid_key, rows_key in COMPACT_GRIDS.items():
+        grid = payload.get(grid_key)
+        if isinstance(grid, dict):
+            compact[grid_key] = [[cell(grid.get(row, {}).get(column)) for column in columns]
+                                 for row in payload.get(rows_key) or []]
+    for list_key in COMPACT_RECORD_LISTS:
+        records = payload.get(list_key)
+        if records:
+            fields = list(records[0])
+            compact[list_key] = {'fields': fields, 'records': [[code(record.get(f)) for f in fields] for record in records]}
+    compact['format'] = 'compact'
+    compact['strings'] = strings
+    return compact
+
+
+# --- RESPONSE CACHE ---
+IDENTITY_VARIANT = ('json', 'identity') # (wire format, content coding) of a plain JSON body
+
+class ResponseCache:
+    """Bounded LRU of serialized JSON bodies for the read-only API routes.
+
+    Keys are tuples like ('classroom', 'NC01'). Each key holds its bodies
+    per variant, e.g. ('json', 'identity') or ('compact', 'br'), and counts
+    once against `maxsize`. Every lookup carries the dataset version; the
+    first lookup with a new version drops everything built from the old data,
+    unless a reload already moved the entries over with carry_over().
+    """
+
+    MAX_SUPERSEDED = 8 # Versions remembered as older than the current one
+
+    def __init__(self, maxsize=RESPONSE_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self.carried = 0
+        self.invalidated = 0
+        self._entries = OrderedDict()
+        self._superseded = deque(maxlen=self.MAX_SUPERSEDED)
+        self._lock = threading.Lock()
+
+    def get(self, version, key, variant=IDENTITY_VARIANT):
+        with self._lock:
+            if version != self.version:
+                if version in self._superseded:
+                    # A request still on the snapshot a reload replaced; don't wipe the new entries.
+                    self.misses += 1
+                    return None
+                self._entries.clear()
+                self.version = version
+            variants = self._entries.get(key)
+            body = variants.get(variant) if variants is not None else None
+            if body is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return body
+
+    def put(self, version, key, body, variant=IDENTITY_VARIANT):
+        with self._lock:
+            if version != self.version:
+                return # Data was swapped while this body was being built
+            self._entries.setdefault(key, {})[variant] = body
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def carry_over(self, old_version, new_version, affects):
+        """Re-keys the entries built from `old_version` to `new_version`, dropping each key
+        `affects(key)` is true for. Returns (kept, dropped)."""
+        with self._lock:
+            if self.version != old_version:
+                kept, dropped = 0, len(self._entries)
+                self._entries.clear()
+            else:
+                stale = [key for key in self._entries if affects(key)]
+                for key in stale:
+                    del self._entries[key]
+                kept, dropped = len(self._entries), len(stale)
+            if self.version is not None:
+                self._superseded.append(self.version)
+            self.version = new_version
+            self.carried += kept
+            self.invalidated += dropped
+            return kept, dropped
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'version': self.version,
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'carried_over': self.carried,
+                'invalidated': self.invalidated,
+            }
+
+
+
+
+# --- STARTUP LOAD ---
+DATASETS = DatasetRegistry(CSV_PATH, DATASETS_DIR)
+# The default dataset's cache and reloader, under their single-dataset names
+RESPONSE_CACHE = DATASETS.default.cache
+RELOADER = DATASETS.default.reloader
+
+def make_etag(version, key, variant=IDENTITY_VARIANT):
+    """Strong ETag for one validated query against one dataset version, per representation."""
+    tag = (version, key) if variant == IDENTITY_VARIANT else (version, key, variant)
+    return hashlib.sha1(repr(tag).encode('utf-8')).hexdigest()[:20]
+
+def _set_cache_headers(response, etag, last_modified):
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    response.headers['Cache-Control'] = JSON_CACHE_CONTROL
+    return response
+
+def _is_not_modified(etag, last_modified):
+    # If-None-Match wins over If-Modified-Since when both are sent (RFC 9110 13.2.2).
+    if request.if_none_match:
+        return request.if_none_match.contains(etag)
+    if request.if_modified_since and last_modified is not None:
+        return last_modified <= request.if_modified_since
+    return False
+
+def negotiate_variant():
+    """(format, content coding) this request should get: ?format=compact and Accept-Encoding."""
+    wire_format = 'compact' if request.args.get('format') == 'compact' else 'json'
+    encoding = request.accept_encodings.best_match(RESPONSE_ENCODINGS) or 'identity'
+    return wire_format, encoding
+
+def cached_json_response(snapshot, key, build_payload):
+    """Serves the cached JSON body for `key`, building it with `build_payload()` on a miss.
+
+    Conditional requests are answered with a 304 before anything is built.
+    """
+    version = snapshot.version
+    last_modified = snapshot.mtime
+    variant = negotiate_variant()
+    etag = make_etag(version, key, variant)
+    if _is_not_modified(etag, last_modified):
+        response = _set_cache_headers(app.response_class(status=304), etag, last_modified)
+        response.vary.add('Accept-Encoding')
+        return response
+
+    body = get_cached_body(snapshot, key, build_payload, variant)
+    response = app.response_class(body, mimetype=app.json.mimetype)
+    if variant[1] != 'identity':
+        response.headers['Content-Encoding'] = variant[1]
+    response.vary.add('Accept-Encoding')
+    return _set_cache_headers(response, etag, last_modified)
+
+def get_cached_body(snapshot, key, build_payload, variant=IDENTITY_VARIANT):
+    """The serialized body for `key` in `variant`, from the cache when possible.
+
+    JSON variants end with jsonify's trailing newline. A compressed variant is
+    made from the cached uncompressed one, so the payload is built only once.
+    """
+    cache = current_dataset().cache
+    body = cache.get(snapshot.version, key, variant)
+    if body is not None:
+        return body
+    wire_format, encoding = variant
+    if encoding != 'identity':
+        body = compress_body(get_cached_body(snapshot, key, build_payload, (wire_format, 'identity')), encoding)
+    else:
+        started = time.perf_counter()
+        payload = build_payload()
+        built = time.perf_counter()
+        if wire_format == 'compact':
+            payload = compact_payload(payload)
+        body = jsonify(payload).get_data()
+        METRICS.observe('tt_build_duration_seconds', key[0], built - started)
+        METRICS.observe('tt_serialize_duration_seconds', key[0], time.perf_counter() - built)
+    cache.put(snapshot.version, key, body, variant)
+    return body
+
+def compress_body(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+# --- METRICS ---
+def _label(name, value):
+    escaped = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return f'{name}="{escaped}"'
+
+class Metrics:
+    """Request latency histograms and counters, rendered in Prometheus text format.
+
+    Each process keeps its own numbers. With METRICS_DIR set, every worker
+    dumps them to <dir>/metrics-<pid>.json at most every METRICS_FLUSH_SECONDS
+    and /metrics sums all the files, so a scrape that lands on any gunicorn
+    worker reports the whole server. Clear the directory when the server
+    starts, as with prometheus_client's multiprocess mode.
+    """
+
+    HISTOGRAMS = {
+        'tt_request_duration_seconds': ('route', 'Time to handle a request, by Flask endpoint.'),
+        'tt_build_duration_seconds': ('view', 'Time spent building a payload on a response cache miss.'),
+        'tt_serialize_duration_seconds': ('view', 'Time spent serializing a payload to JSON on a response cache miss.'),
+    }
+    COUNTERS = {
+        'tt_response_cache_hits_total': 'Response cache hits.',
+        'tt_response_cache_misses_total': 'Response cache misses.',
+        'tt_reloads_total': 'Dataset reloads swapped in.',
+        'tt_reload_failures_total': 'Dataset reloads rejected or failed.',
+        'tt_dataset_evictions_total': 'Datasets unloaded by the registry.',
+    }
+
+    def __init__(self, directory=METRICS_DIR, buckets=LATENCY_BUCKETS):
+        self.directory = directory
+        self.buckets = buckets
+        self._histograms = {name: {} for name in self.HISTOGRAMS}
+        self._lock = threading.Lock()
+        self._last_flush = 0.0
+
+    def observe(self, name, label, seconds):
+        with self._lock:
+            series = self._histograms[name].get(label)
+            if series is None:
+                # Per-bucket (not cumulative) counts, the last one being +Inf, then the sum.
+                series = self._histograms[name][label] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[bisect_left(self.buckets, seconds)] += 1
+            series[-1] += seconds
+
+    def local_state(self):
+        totals = DATASETS.totals()
+        with self._lock:
+            histograms = {name: {label: list(series) for label, series in by_label.items()}
+                          for name, by_label in self._histograms.items()}
+        return {
+            'histograms': histograms,
+            'counters': {
+                'tt_response_cache_hits_total': totals['hits'],
+                'tt_response_cache_misses_total': totals['misses'],
+                'tt_reloads_total': totals['reloads'],
+                'tt_reload_failures_total': totals['failures'],
+                'tt_dataset_evictions_total': DATASETS.evictions,
+            },
+        }
+
+    def _state_path(self, pid):
+        return os.path.join(self.directory, f"metrics-{pid}.json")
+
+    def maybe_flush(self, force=False):
+        """Writes this worker's numbers to the shared directory if they are due."""
+        if not self.directory:
+            return
+        now = time.monotonic()
+        if not force and now - self._last_flush < METRICS_FLUSH_SECONDS:
+            return
+        self._last_flush = now
+        path = self._state_path(os.getpid())
+        tmp_path = f"{path}.tmp"
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(tmp_path, 'w', encoding='utf-8') as state_file:
+                json.dump(self.local_state(), state_file)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.error("Could not write metrics to %s: %s", path, e)
+
+    def collect(self):
+        """This worker's live numbers plus the last dump of every other worker. Returns (state, workers)."""
+        states = [self.local_state()]
+        if self.directory and os.path.isdir(self.directory):
+            own_file = os.path.basename(self._state_path(os.getpid()))
+            for filename in os.listdir(self.directory):
+                if filename == own_file or not (filename.startswith('metrics-') and filename.endswith('.json')):
+                    continue
+                try:
+                    with open(os.path.join(self.directory, filename), encoding='utf-8') as state_file:
+                        states.append(json.load(state_file))
+                except (OSError, ValueError):
+                    continue # Half-written or vanished; it will be there next scrape
+
+        merged = {'histograms': {name: {} for name in self.HISTOGRAMS}, 'counters': dict.fromkeys(self.COUNTERS, 0)}
+        for state in states:
+            for name, by_label in state.get('histograms', {}).items():
+                target = merged['histograms'].get(name)
+                if target is None:
+                    continue
+                for label, series in by_label.items():
+                    if label in target:
+                        target[label] = [a + b for a, b in zip(target[label], series)]
+                    else:
+                        target[label] = list(series)
+            for name, value in state.get('counters', {}).items():
+                if name in merged['counters']:
+                    merged['counters'][name] += value
+        return merged, len(states)
+
+    def render(self):
+        state, workers = self.collect()
+        lines = []
+        for name, (label_name, help_text) in self.HISTOGRAMS.items():
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+            for label, series in sorted(state['histograms'][name].items()):
+                label = _label(label_name, label)
+                cumulative = 0
+                for bound, count in zip(self.buckets + ('+Inf',), series):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{{{label},le="{bound}"}} {cumulative}')
+                lines.append(f"{name}_sum{{{label}}} {series[-1]:.6f}")
+                lines.append(f"{name}_count{{{label}}} {cumulative}")
+        for name, help_text in self.COUNTERS.items():
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter", f"{name} {state['counters'][name]}"]
+
+        counters = state['counters']
+        lookups = counters['tt_response_cache_hits_total'] + counters['tt_response_cache_misses_total']
+        datasets = DATASETS.loaded()
+        gauges = [
+            ('tt_response_cache_hit_ratio', 'Response cache hits over lookups, across workers.',
+             round(counters['tt_response_cache_hits_total'] / lookups, 4) if lookups else 0),
+            ('tt_datasets_loaded', 'Datasets loaded in the worker that answered this scrape.', len(datasets)),
+            ('tt_metrics_workers', 'Worker processes included in these numbers.', workers),
+        ]
+        for name, help_text, value in gauges:
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge", f"{name} {value}"]
+
+        # Per-dataset gauges come from the answering worker; every worker loads the same files.
+        dataset_gauges = [
+            ('tt_dataset_rows', 'Schedule entries in the published snapshot.', lambda s: len(s.schedule or [])),
+            ('tt_dataset_load_seconds', 'Time taken to load the published snapshot.', lambda s: round(s.load_seconds or 0, 6)),
+            ('tt_dataset_bytes', 'Approximate memory held by the published snapshot.', lambda s: s.nbytes()),
+        ]
+        for name, help_text, value in dataset_gauges:
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+            lines += [f"{name}{{{_label('dataset', d.name)}}} {value(d.snapshot)}" for d in datasets]
+        lines += ["# HELP tt_dataset_info Version of each published snapshot.", "# TYPE tt_dataset_info gauge"]
+        lines += [f"tt_dataset_info{{{_label('dataset', d.name)},{_label('version', d.snapshot.version)}}} 1" for d in datasets]
+        return '\n'.join(lines) + '\n'
+
+
+METRICS = Metrics()
+
+@app.before_request
+def start_request_timer():
+    request.environ['tt.started'] = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    started = request.environ.get('tt.started')
+    if started is not None:
+        METRICS.observe('tt_request_duration_seconds', request.endpoint or 'unmatched', time.perf_counter() - started)
+        METRICS.maybe_flush()
+    return response
+
+
+# --- STATIC ASSET FINGERPRINTS ---
+_STATIC_FINGERPRINTS = {}
+
+def static_fingerprint(filename):
+    """Content hash of a file under static/, recomputed only when its mtime changes."""
+    path = os.path.join(app.static_folder, filename)
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+    cached = _STATIC_FINGERPRINTS.get(filename)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    with open(path, 'rb') as static_file:
+        fingerprint = hashlib.sha1(static_file.read()).hexdigest()[:12]
+    _STATIC_FINGERPRINTS[filename] = (mtime, fingerprint)
+    return fingerprint
+
+@app.url_defaults
+def add_static_fingerprint(endpoint, values):
+    # url_for('static', filename='script.js') -> /static/script.js?v=<content hash>
+    if endpoint == 'static' and 'filename' in values and 'v' not in values:
+        fingerprint = static_fingerprint(values['filename'])
+        if fingerprint:
+            values['v'] = fingerprint
+
+@app.after_request
+def cache_fingerprinted_static(response):
+    if request.endpoint == 'static' and response.status_code == 200:
+        fingerprint = request.args.get('v')
+        if fingerprint and fingerprint == static_fingerprint(request.view_args.get('filename', '')):
+            response.headers['Cache-Control'] = STATIC_IMMUTABLE_CACHE_CONTROL
+    return response
 
 
 # --- FLASK ROUTES (API) ---
 
+@app.before_request
+def select_dataset():
+    if request.endpoint == 'static':
+        return None # Static files are the same for every dataset; don't load or evict one to serve them
+    # /d/<name>/... (see DatasetPathMiddleware) wins over ?dataset=<name>; neither means the default.
+    name = request.environ.get('tt.dataset') or request.args.get('dataset') or DEFAULT_DATASET
+    dataset = DATASETS.get(name)
+    if dataset is None:
+        return jsonify({'error': f"Unknown dataset '{name}'."}), 404
+    g.dataset = dataset
+    dataset.reloader.ensure_started()
+
 # --- UPDATED / ROUTE ---
 @app.route('/')
 def index():
-    if SCHEDULE_DATA is None:
-        return render_template('index.html', days=[], time_slots=[], rooms=[], subjects=[], teachers=[], lab_subjects=[])
+    snapshot = current_snapshot()
+    # /d/<name>/ pages reach their API through request.script_root; ?dataset= pages must pass it on.
+    dataset = current_dataset()
+    dataset_param = '' if 'tt.dataset' in request.environ or dataset is DATASETS.default else dataset.name
+    if snapshot.schedule is None:
+        return render_template('index.html', days=[], time_slots=[], rooms=[], subjects=[], teachers=[], lab_subjects=[],
+                               dataset_param=dataset_param)
+    def embed(options):
+        return options if len(options) <= EMBED_OPTIONS_MAX else None # None: render a /search typeahead instead
     return render_template('index.html',
+                            dataset_param=dataset_param,
+                            live_stream_path=app.config.get('LIVE_STREAM_PATH'),
                             days=DAYS_ORDER or [],
                             time_slots=TIME_SLOTS or [], # <-- Added 1-hour slots
-                            rooms=CLASSROOMS or [],
-                            subjects=UNIQUE_SUBJECTS or [],
-                            teachers=UNIQUE_TEACHERS or [],
-                            lab_subjects=UNIQUE_LAB_SUBJECTS or []) 
+                            rooms=embed(snapshot.classrooms or []),
+                            subjects=embed(snapshot.subjects or []),
+                            teachers=embed(snapshot.teachers or []),
+                            lab_subjects=embed(snapshot.lab_subjects or [])) 
 
 # --- NEW /get_live_schedule ROUTE ---
 @app.route('/get_live_schedule', methods=['GET'])
 def get_live_schedule_route():
     selected_day = request.args.get('day')
     selected_slot = request.args.get('slot')
+    snapshot = current_snapshot()
     
     if not selected_day or selected_day not in DAYS_ORDER:
         return jsonify({'error': 'Please select a valid day.'}), 400
     if not selected_slot or selected_slot not in TIME_SLOTS:
         return jsonify({'error': 'Please select a valid time slot.'}), 400
-        
-    theory, labs = get_live_schedule(selected_day, selected_slot)
-    
-    return jsonify({
-        'title': f"Schedule for {selected_day}, {selected_slot}",
-        'theory_classes': theory,
-        'lab_classes': labs
-    })
+
+    return cached_json_response(snapshot, ('live', selected_day, selected_slot),
+                                lambda: live_schedule_payload(selected_day, selected_slot, snapshot))
 
 
 # --- (Existing API Routes - Unchanged) ---
 
+def grid_view_response(view_name, value):
+    view = GRID_VIEWS[view_name]
+    snapshot = current_snapshot()
+    if not value or value not in (view.valid_values(snapshot) or []):
+        return jsonify({'error': view.error}), 400
+    return cached_json_response(snapshot, (view_name, value), lambda: view.build_payload(value, snapshot))
+
 @app.route('/get_by_classroom', methods=['GET'])
 def get_by_classroom():
-    selected_room = request.args.get('value')
-    if not selected_room or selected_room not in (CLASSROOMS or []):
-        return jsonify({'error': 'Please select a valid classroom.'}), 400
-    grid = build_classroom_grid(selected_room)
-    return jsonify({'columns': DAYS_ORDER or [], 'rows': TIME_SLOTS or [], 'grid': grid or {}, 'title': f"Schedule for Classroom: {selected_room}"})
+    return grid_view_response('classroom', request.args.get('value'))
 
 @app.route('/get_by_day', methods=['GET'])
 def get_by_day():
-    selected_day = request.args.get('value')
-    if not selected_day or selected_day not in (DAYS_ORDER or []):
-        return jsonify({'error': 'Please select a valid day.'}), 400
-    classroom_grid, scheduled_labs = build_day_view(selected_day)
-    return jsonify({'grid_type': 'hybrid_day_view',
-                    'columns': CLASSROOMS or [], 
-                    'rows': TIME_SLOTS or [],
-                    'classroom_grid': classroom_grid or {},
-                    'scheduled_labs': scheduled_labs if isinstance(scheduled_labs, list) else [],
-                    'title': f"Schedule for {selected_day}"})
+    return grid_view_response('day', request.args.get('value'))
 
 @app.route('/get_by_subject', methods=['GET'])
 def get_by_subject():
-    selected_subject = request.args.get('value')
-    if not selected_subject or selected_subject not in (UNIQUE_SUBJECTS or []):
-        return jsonify({'error': 'Please select a valid subject.'}), 400
-    grid = build_subject_grid(selected_subject)
-    return jsonify({'columns': DAYS_ORDER or [], 'rows': TIME_SLOTS or [], 'grid': grid or {}, 'title': f"Schedule for Subject: {selected_subject}"})
+    return grid_view_response('subject', request.args.get('value'))
 
 @app.route('/get_by_teacher', methods=['GET'])
 def get_by_teacher():
-    selected_teacher = request.args.get('value')
-    if not selected_teacher or selected_teacher not in (UNIQUE_TEACHERS or []):
-        return jsonify({'error': 'Please select a valid teacher.'}), 400
-    grid = build_teacher_grid(selected_teacher)
-    return jsonify({'columns': DAYS_ORDER or [], 'rows': TIME_SLOTS or [], 'grid': grid or {}, 'title': f"Schedule for {selected_teacher}"})
+    return grid_view_response('teacher', request.args.get('value'))
 
 @app.route('/get_by_labs', methods=['GET'])
 def get_by_labs():
-    selected_lab_subject = request.args.get('value')
-    if not selected_lab_subject or selected_lab_subject not in (UNIQUE_LAB_SUBJECTS or []):
-        return jsonify({'error': 'Please select a valid lab subject.'}), 400
-        
-    grid = build_labs_grid(selected_lab_subject)
-    return jsonify({
-        'grid_type': 'labs_view', 
-        'columns': DAYS_ORDER or [], 
-        'rows': LAB_TIME_SLOTS or [], 
-        'grid': grid or {}, 
-        'title': f"Lab Schedule for {selected_lab_subject}"
-    })
+    return grid_view_response('labs', request.args.get('value'))
+
+
+# --- /get_batch ROUTE ---
+def _parse_batch_queries(snapshot):
+    """(view, value) pairs from a POSTed {"queries": [{"view", "value"}, ...]} body or from
+    ?view=<view>[&value=...]. A value of "*" (or no value on GET) means every valid value."""
+    if request.method == 'POST':
+        body = request.get_json(silent=True)
+        if not isinstance(body, dict):
+            body = {}
+        raw_queries = body.get('queries')
+        stream = bool(body.get('stream'))
+        if not isinstance(raw_queries, list) or not all(isinstance(q, dict) for q in raw_queries):
+            return None, stream, 'POST a JSON body like {"queries": [{"view": "classroom", "value": "NC01"}]}.'
+        pairs = [(q.get('view'), q.get('value')) for q in raw_queries]
+    else:
+        stream = request.args.get('stream', '').lower() in ('1', 'true', 'yes')
+        values = request.args.getlist('value') or ['*']
+        pairs = [(request.args.get('view'), value) for value in values]
+
+    queries = []
+    for view_name, value in pairs:
+        if not isinstance(view_name, str) or view_name not in GRID_VIEWS:
+            return None, stream, f"Unknown view {view_name!r}; expected one of {sorted(GRID_VIEWS)}."
+        if value is not None and not isinstance(value, str):
+            return None, stream, f"The value for view {view_name!r} must be a string, got {value!r}."
+        if value == '*':
+            queries.extend((view_name, v) for v in GRID_VIEWS[view_name].valid_values(snapshot))
+        else:
+            queries.append((view_name, value))
+    if len(queries) > MAX_BATCH_QUERIES:
+        return None, stream, f"A batch may contain at most {MAX_BATCH_QUERIES} queries."
+    return queries, stream, None
+
+def _batch_item(snapshot, view_name, value):
+    """One result as JSON bytes. Grid bodies are spliced in from the response cache as-is."""
+    view = GRID_VIEWS[view_name]
+    head = app.json.dumps({'view': view_name, 'value': value}, separators=(',', ':'))[:-1].encode('utf-8')
+    if not value or value not in (view.valid_values(snapshot) or []):
+        return head + b',"status":400,"data":' + app.json.dumps({'error': view.error}, separators=(',', ':')).encode('utf-8') + b'}'
+    body = get_cached_body(snapshot, (view_name, value), lambda: view.build_payload(value, snapshot))
+    return head + b',"status":200,"data":' + body.rstrip(b'\n') + b'}'
+
+@app.route('/get_batch', methods=['GET', 'POST'])
+def get_batch():
+    snapshot = current_snapshot()
+    queries, stream, error = _parse_batch_queries(snapshot)
+    if error:
+        return jsonify({'error': error}), 400
+
+    if stream:
+        # NDJSON: each grid is flushed as soon as it is built.
+        def generate():
+            for view_name, value in queries:
+                yield _batch_item(snapshot, view_name, value) + b'\n'
+        return app.response_class(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+    etag = make_etag(snapshot.version, ('batch', tuple(queries)))
+    if _is_not_modified(etag, snapshot.mtime):
+        return _set_cache_headers(app.response_class(status=304), etag, snapshot.mtime)
+    body = b'{"results":[' + b','.join(_batch_item(snapshot, v, value) for v, value in queries) + b']}\n'
+    return _set_cache_headers(app.response_class(body, mimetype=app.json.mimetype), etag, snapshot.mtime)
+
+
+@app.route('/get_free_rooms', methods=['GET'])
+def get_free_rooms():
+    """?day=Monday&start=10:30-11:30[&end=12:30-01:30][&min_length=2][&prefix=NC]"""
+    selected_day = request.args.get('day')
+    start_slot = request.args.get('start') or request.args.get('slot') or TIME_SLOTS[0]
+    end_slot = request.args.get('end') or (start_slot if request.args.get('slot') else TIME_SLOTS[-1])
+    prefix = request.args.get('prefix', '').strip()
+    snapshot = current_snapshot()
+
+    if not selected_day or selected_day not in DAYS_ORDER:
+        return jsonify({'error': 'Please select a valid day.'}), 400
+    if start_slot not in SLOT_INDEX or end_slot not in SLOT_INDEX or SLOT_INDEX[start_slot] > SLOT_INDEX[end_slot]:
+        return jsonify({'error': 'Please select a valid time slot range.'}), 400
+    first, last = SLOT_INDEX[start_slot], SLOT_INDEX[end_slot]
+    raw_min_length = request.args.get('min_length')
+    min_length = request.args.get('min_length', type=int)
+    if raw_min_length is not None and (min_length is None or not 1 <= min_length <= last - first + 1):
+        return jsonify({'error': 'min_length must fit inside the selected slot range.'}), 400
+
+    def build_payload():
+        return {
+            'title': f"Free rooms on {selected_day}, {start_slot.split('-')[0]}-{end_slot.split('-')[1]}",
+            'day': selected_day,
+            'start': start_slot,
+            'end': end_slot,
+            'min_length': min_length,
+            'free_rooms': find_free_rooms(selected_day, first, last, min_length, prefix, snapshot),
+        }
+    key = ('free_rooms', selected_day, first, last, min_length, prefix.upper())
+    if not prefix:
+        return cached_json_response(snapshot, key, build_payload)
+    # Prefixes are free text: like /search, answer them from the occupancy bitmaps
+    # rather than letting arbitrary strings push grid bodies out of the response cache.
+    etag = make_etag(snapshot.version, key)
+    if _is_not_modified(etag, snapshot.mtime):
+        return _set_cache_headers(app.response_class(status=304), etag, snapshot.mtime)
+    return _set_cache_headers(jsonify(build_payload()), etag, snapshot.mtime)
+
+
+def normalize_lab_batch(value, snapshot):
+    """'3', 'batch 3a' or 'Batch 3A' -> the matching entry of snapshot.lab_batches, else None."""
+    value = ' '.join(value.split())
+    if not value.lower().startswith('batch'):
+        value = f"Batch {value}"
+    wanted = value.lower().replace(' ', '')
+    for batch in snapshot.lab_batches:
+        if batch.lower().replace(' ', '') == wanted:
+            return batch
+    return None
+
+@app.route('/get_personal', methods=['GET'])
+def get_personal():
+    """?division=Division 1[&batch=Batch 3] -> that division's theory week plus one batch's labs."""
+    selected_division = request.args.get('division', '').strip()
+    raw_batch = request.args.get('batch', '').strip()
+    snapshot = current_snapshot()
+
+    if not selected_division or selected_division not in snapshot.index.by_division:
+        return jsonify({'error': 'Please select a valid division.'}), 400
+    selected_batch = normalize_lab_batch(raw_batch, snapshot) if raw_batch else None
+    if raw_batch and selected_batch is None:
+        return jsonify({'error': 'Please select a valid lab batch.'}), 400
+
+    def build_payload():
+        grid, lab_grid = build_personal_grid(selected_division, selected_batch, snapshot)
+        title = f"Timetable for {selected_division}" + (f", {selected_batch}" if selected_batch else '')
+        return {
+            'grid_type': 'personal_view',
+            'columns': DAYS_ORDER,
+            'rows': TIME_SLOTS,
+            'grid': grid,
+            'lab_rows': LAB_TIME_SLOTS,
+            'lab_grid': lab_grid,
+            'division': selected_division,
+            'batch': selected_batch,
+            'title': title,
+        }
+    return cached_json_response(snapshot, ('personal', selected_division, selected_batch), build_payload)
+
+
+@app.route('/search', methods=['GET'])
+def search():
+    """?q=kulk[&kind=teacher,classroom][&limit=10] -> ranked entity names for a typeahead."""
+    query = request.args.get('q', '')[:MAX_SEARCH_QUERY_LENGTH]
+    kinds = tuple(kind.strip() for kind in request.args.get('kind', '').split(',') if kind.strip())
+    limit = request.args.get('limit', SEARCH_LIMIT, type=int)
+    snapshot = current_snapshot()
+
+    if any(kind not in SEARCH_KINDS for kind in kinds):
+        return jsonify({'error': f"kind must be one of: {', '.join(SEARCH_KINDS)}."}), 400
+    limit = max(1, min(limit, MAX_SEARCH_RESULTS))
+    # Every keystroke is a new query: answering from the index is cheaper than
+    # letting typeahead traffic push grid bodies out of the response cache.
+    etag = make_etag(snapshot.version, ('search', ' '.join(_search_words(query)), kinds, limit))
+    if _is_not_modified(etag, snapshot.mtime):
+        return _set_cache_headers(app.response_class(status=304), etag, snapshot.mtime)
+    results = get_search_index(snapshot).search(query, kinds, limit)
+    return _set_cache_headers(jsonify({'query': query, 'results': results}), etag, snapshot.mtime)
+
+
+@app.route('/diff', methods=['GET'])
+def diff():
+    """What the last hot reload changed, or with ?against=<dataset> how that dataset differs from this one."""
+    dataset = current_dataset()
+    snapshot = dataset.snapshot
+    against = request.args.get('against', '').strip()
+    if not against:
+        if dataset.last_diff is None:
+            return jsonify({'error': 'This dataset has not been reloaded yet; pass ?against=<dataset> to compare two datasets.'}), 404
+        return jsonify(dataset.last_diff.to_dict(MAX_DIFF_CHANGES))
+    other = DATASETS.get(against)
+    if other is None:
+        return jsonify({'error': f"Unknown dataset '{against}'."}), 404
+    other_snapshot = other.snapshot
+    return cached_json_response(snapshot, ('diff', against, other_snapshot.version),
+                                lambda: SnapshotDiff(other_snapshot, snapshot).to_dict(MAX_DIFF_CHANGES))
+
+
+@app.route('/get_conflicts', methods=['GET'])
+def get_conflicts():
+    snapshot = current_snapshot()
+    return cached_json_response(snapshot, ('conflicts',), lambda: find_conflicts(snapshot))
+
+
+@app.route('/get_utilisation', methods=['GET'])
+def get_utilisation_route():
+    """Room occupancy, teacher hours, peak-slot heatmaps and idle gaps, built once per dataset version."""
+    snapshot = current_snapshot()
+    return cached_json_response(snapshot, ('utilisation',), lambda: get_utilisation(snapshot))
+
+
+@app.route('/cache_stats', methods=['GET'])
+def cache_stats():
+    return jsonify(current_dataset().cache.stats())
+
+@app.route('/reload_stats', methods=['GET'])
+def reload_stats():
+    return jsonify(current_dataset().reloader.stats())
+
+@app.route('/ingest_report', methods=['GET'])
+def ingest_report():
+    """What the CSV load behind the served timetable skipped or repaired, row by row."""
+    snapshot = current_snapshot()
+    return jsonify({'dataset': current_dataset().name, 'version': snapshot.version, 'report': snapshot.ingest_report})
+
+@app.route('/datasets', methods=['GET'])
+def datasets():
+    return jsonify(DATASETS.stats())
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    METRICS.maybe_flush(force=True)
+    response = app.response_class(METRICS.render(), mimetype='text/plain')
+    response.headers['Content-Type'] = 'text/plain; version=0.0.4; charset=utf-8'
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+
+# --- CLI COMMANDS ---
+@app.cli.command('build-snapshot')
+@click.argument('csv_path', required=False)
+def build_snapshot_command(csv_path):
+    """Pre-parse a timetable CSV into the binary snapshot workers load at startup."""
+    csv_path = os.path.abspath(csv_path or CSV_PATH)
+    snapshot = load_snapshot_from_csv(csv_path)
+    error = snapshot.validate()
+    if error:
+        raise click.ClickException(error)
+    snapshot_path = get_binary_snapshot_path(csv_path)
+    nbytes = write_binary_snapshot(snapshot, snapshot_path)
+    click.echo(f"Wrote {snapshot_path} ({len(snapshot.schedule)} entries, {nbytes} bytes, version {snapshot.version}).")
+
+@app.cli.command('check-csv')
+@click.argument('csv_path', required=False)
+@click.option('--json', 'as_json', is_flag=True, help='Print the full report as JSON.')
+def check_csv_command(csv_path, as_json):
+    """Validate a timetable CSV and report every row the loader would skip or repair."""
+    csv_path = os.path.abspath(csv_path or CSV_PATH)
+    report = IngestReport(csv_path)
+    schedule = load_schedule_from_csv(csv_path, ColumnarSchedule(), report)
+    if as_json:
+        click.echo(json.dumps(report.to_dict(), indent=2, ensure_ascii=False))
+    else:
+        for issue in report.issues:
+            click.echo(f"  line {issue['line']}: {issue['severity']}: {issue['kind']}: {issue['message']}")
+        if sum(report.counts.values()) > len(report.issues):
+            click.echo(f"  ... first {len(report.issues)} issues shown; totals: {report.summary()}")
+        click.echo(f"\nLoaded {report.rows_loaded} of {report.rows_read} rows in {report.seconds * 1000:.1f} ms.")
+    if schedule is None:
+        raise click.ClickException(f"{csv_path} cannot be loaded: {report.fatal}")
+
+@app.cli.command('diff')
+@click.argument('old_csv')
+@click.argument('new_csv', required=False)
+@click.option('--json', 'as_json', is_flag=True, help='Print the full diff as JSON.')
+def diff_command(old_csv, new_csv, as_json):
+    """Show the classes added, removed and moved between two timetable CSVs (NEW defaults to the served one)."""
+    snapshots = []
+    for path in (old_csv, new_csv or CSV_PATH):
+        snapshot = load_snapshot_from_csv(os.path.abspath(path))
+        error = snapshot.validate()
+        if error:
+            raise click.ClickException(error)
+        snapshots.append(snapshot)
+    old, new = snapshots
+    started = time.perf_counter()
+    changes = SnapshotDiff(old, new)
+    elapsed = time.perf_counter() - started
+    if as_json:
+        click.echo(json.dumps(changes.to_dict(), indent=2, ensure_ascii=False))
+        return
+
+    def describe(key):
+        return f"{key[0]} ({key[1]}, {key[5] or 'N/A'})"
+
+    def where(key):
+        return f"{key[2]} {key[3]} {key[4]}"
+
+    for key in changes.added:
+        click.echo(f"+ {where(key)}: {describe(key)}")
+    for key in changes.removed:
+        click.echo(f"- {where(key)}: {describe(key)}")
+    for before, after in changes.moved:
+        click.echo(f"~ {describe(before)}: {where(before)} -> {where(after)}")
+    report = changes.to_dict()
+    for name in ('by_room', 'by_teacher', 'by_division'):
+        click.echo(f"\n{name.replace('by_', 'Changes by ').title()}: {len(report[name])}")
+        for entity, counts in report[name].items():
+            click.echo(f"  {entity}: +{counts['added']} -{counts['removed']} ~{counts['moved']}")
+    if changes.reordered:
+        click.echo("\nShared rows are in a different order; a reload would rebuild every cached response.")
+    else:
+        # What a hot reload from OLD to NEW would rebuild, per /get_by_* view
+        click.echo("\nCached grids a reload would rebuild:")
+        for view_name, view in GRID_VIEWS.items():
+            values = view.valid_values(new)
+            stale = sum(changes.affects((view_name, value)) for value in values)
+            click.echo(f"  {view_name}: {stale} of {len(values)}")
+    click.echo(f"\n{len(changes.added)} added, {len(changes.removed)} removed, {len(changes.moved)} moved, "
+               f"{changes.unchanged} unchanged; compared in {elapsed * 1000:.1f} ms.")
+
+@app.cli.command('conflicts')
+@click.argument('csv_path', required=False)
+@click.option('--json', 'as_json', is_flag=True, help='Print the full report as JSON.')
+def conflicts_command(csv_path, as_json):
+    """Report room, teacher and division clashes in a timetable CSV."""
+    csv_path = os.path.abspath(csv_path or CSV_PATH)
+    snapshot = load_snapshot_from_csv(csv_path)
+    error = snapshot.validate()
+    if error:
+        raise click.ClickException(error)
+    started = time.perf_counter()
+    report = find_conflicts(snapshot)
+    elapsed = time.perf_counter() - started
+    if as_json:
+        click.echo(json.dumps(report, indent=2, ensure_ascii=False))
+        return
+    labels = {'room_conflicts': 'room', 'teacher_conflicts': 'teacher', 'division_conflicts': 'division'}
+    for name, label in labels.items():
+        click.echo(f"\n{name.replace('_', ' ').title()}: {len(report[name])}")
+        for conflict in report[name]:
+            classes = '; '.join(f"{c['subject']} ({c['division']}, {c['room']}, {c['teacher']})" for c in conflict['classes'])
+            click.echo(f"  {conflict['day']} {conflict['time']} {conflict[label]}: {classes}")
+    click.echo(f"\nChecked {len(snapshot.schedule)} entries in {elapsed * 1000:.1f} ms.")
+
+@app.cli.command('utilisation')
+@click.argument('csv_path', required=False)
+@click.option('--top', type=int, default=10, help='How many rooms and teachers to list.')
+@click.option('--json', 'as_json', is_flag=True, help='Print the full report as JSON.')
+def utilisation_command(csv_path, top, as_json):
+    """Report room occupancy, teacher hours and the busiest slots of a timetable CSV."""
+    csv_path = os.path.abspath(csv_path or CSV_PATH)
+    snapshot = load_snapshot_from_csv(csv_path)
+    error = snapshot.validate()
+    if error:
+        raise click.ClickException(error)
+    started = time.perf_counter()
+    report = get_utilisation(snapshot)
+    elapsed = time.perf_counter() - started
+    if as_json:
+        click.echo(json.dumps(report, indent=2, ensure_ascii=False))
+        return
+    summary = report['summary']
+    click.echo(f"{summary['rooms']} rooms, mean occupancy {summary['mean_room_occupancy']}% "
+               f"of {summary['slots_per_week']} slots; {summary['teachers']} teachers, "
+               f"mean {summary['mean_teacher_hours']} h/week (max {summary['max_teacher_hours']}).")
+    click.echo("\nPeak slots:")
+    for peak in report['peak_slots']:
+        click.echo(f"  {peak['day']} {peak['time']}: {peak['rooms_in_use']} rooms, {peak['teachers_busy']} teachers")
+    rooms = sorted(report['rooms'].items(), key=lambda item: (-item[1]['occupancy'], item[0]))
+    click.echo("\nBusiest rooms:")
+    for room, usage in rooms[:top]:
+        click.echo(f"  {usage['occupancy']:5.1f}%  {room}")
+    teachers = sorted(report['teachers'].items(), key=lambda item: (-item[1]['hours'], item[0]))
+    click.echo("\nHighest teacher load:")
+    for teacher, usage in teachers[:top]:
+        click.echo(f"  {usage['hours']:3d} h ({usage['lab_hours']} lab, {usage['idle_gap_hours']} idle)  {teacher}")
+    click.echo(f"\nComputed over {len(snapshot.schedule)} entries in {elapsed * 1000:.1f} ms.")
 
 
 # --- MAIN EXECUTION ---
@@ -0,0 +1,177 @@
+"""ASGI entry point: the Flask app plus a server-sent-events feed of what is on right now.
+
+    uvicorn asgi:application --host 0.0.0.0 --port $PORT
+    gunicorn -k uvicorn.workers.UvicornWorker asgi:application
+
+Every Flask route is served unchanged through asgiref's WsgiToAsgi. The one
+exception is /live/stream (also /d/<name>/live/stream and ?dataset=<name>),
+which is handled here on the event loop. One LiveBroadcaster per dataset
+works out the current TIME_SLOTS slot every LIVE_TICK_SECONDS. When the slot
+or the dataset version changes, it builds the event once (through the same
+response cache /get_live_schedule uses) and wakes every subscriber. An idle
+subscriber costs one coroutine and no thread, so a single process can hold
+thousands of campus display connections.
+"""
+import asyncio
+import json
+import os
+from urllib.parse import parse_qs
+
+from asgiref.wsgi import WsgiToAsgi
+
+from app import DATASETS, DEFAULT_DATASET, app, current_day_slot, get_live_body, logger
+
+LIVE_STREAM_PATH = '/live/stream'
+LIVE_TICK_SECONDS = float(os.environ.get('TT_LIVE_TICK_SECONDS', '5'))
+LIVE_KEEPALIVE_SECONDS = 20 # Comment frames that keep proxies from closing idle streams
+OFF_HOURS_BODY = b'{"lab_classes":[],"theory_classes":[],"title":"No classes going on right now"}'
+
+app.config['LIVE_STREAM_PATH'] = LIVE_STREAM_PATH # index() points the page's EventSource here
+
+
+# --- LIVE BROADCAST ---
+def _sse_frame(event_id, event, data):
+    lines = b''.join(b'data: ' + line + b'\n' for line in data.split(b'\n'))
+    return f"id: {event_id}\nevent: {event}\n".encode('utf-8') + lines + b'\n'
+
+class LiveBroadcaster:
+    """Computes one dataset's "now" event once per change and fans it out to every subscriber.
+
+    Subscribers never get a queue of their own: they wait on the shared
+    `changed` event and then read `message`, so a slow client only ever
+    skips to the newest state.
+    """
+
+    def __init__(self, dataset_name):
+        self.dataset_name = dataset_name
+        self.subscribers = 0
+        self.seq = 0
+        self.message = None
+        self.changed = asyncio.Event()
+        self._state = None
+        self._task = None
+
+    def subscribe(self):
+        self.subscribers += 1
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def unsubscribe(self):
+        self.subscribers -= 1
+
+    async def _run(self):
+        while self.subscribers > 0:
+            try:
+                await self.tick()
+            except Exception as e:
+                logger.error("[LiveBroadcaster] %s: %s", self.dataset_name, e)
+            await asyncio.sleep(LIVE_TICK_SECONDS)
+
+    async def tick(self):
+        # The registry may have to load the dataset and the body may be a cache miss: keep both off the loop.
+        dataset = await asyncio.to_thread(DATASETS.get, self.dataset_name)
+        if dataset is None:
+            return
+        dataset.reloader.ensure_started()
+        day, slot = current_day_slot()
+        state = (dataset.snapshot.version, day, slot)
+        if state == self._state:
+            return
+        body = await asyncio.to_thread(get_live_body, dataset, day, slot) if slot else OFF_HOURS_BODY
+        head = json.dumps({'day': day, 'slot': slot, 'version': dataset.snapshot.version}, separators=(',', ':'))
+        self._state = state
+        self.seq += 1
+        self.message = _sse_frame(self.seq, 'live', head[:-1].encode('utf-8') + b',"schedule":' + body.rstrip(b'\n') + b'}')
+        changed, self.changed = self.changed, asyncio.Event()
+        changed.set()
+
+    def stats(self):
+        return {'dataset': self.dataset_name, 'subscribers': self.subscribers, 'events': self.seq}
+
+
+BROADCASTERS = {}
+
+def get_broadcaster(dataset_name):
+    broadcaster = BROADCASTERS.get(dataset_name)
+    if broadcaster is None:
+        broadcaster = BROADCASTERS[dataset_name] = LiveBroadcaster(dataset_name)
+    return broadcaster
+
+
+# --- ASGI APPLICATION ---
+flask_application = WsgiToAsgi(app)
+
+def _stream_dataset(scope):
+    """The dataset name if this request is for the live stream, else None."""
+    path = scope['path']
+    name = None
+    if path.startswith('/d/'):
+        name, _, rest = path[len('/d/'):].partition('/')
+        path = '/' + rest
+    if path != LIVE_STREAM_PATH:
+        return None
+    if not name:
+        name = parse_qs(scope['query_string'].decode('latin-1')).get('dataset', [None])[0]
+    return name or DEFAULT_DATASET
+
+async def _wait_for_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+async def live_stream(scope, receive, send, dataset_name):
+    known = await asyncio.to_thread(DATASETS.available)
+    if dataset_name not in known:
+        body = json.dumps({'error': f"Unknown dataset '{dataset_name}'."}).encode('utf-8')
+        await send({'type': 'http.response.start', 'status': 404, 'headers': [(b'content-type', b'application/json')]})
+        await send({'type': 'http.response.body', 'body': body})
+        return
+
+    await send({'type': 'http.response.start', 'status': 200, 'headers': [
+        (b'content-type', b'text/event-stream'),
+        (b'cache-control', b'no-cache'),
+        (b'x-accel-buffering', b'no'), # Stop nginx from buffering the stream
+    ]})
+    broadcaster = get_broadcaster(dataset_name)
+    broadcaster.subscribe()
+    disconnected = asyncio.ensure_future(_wait_for_disconnect(receive))
+    seen = 0
+    try:
+        await send({'type': 'http.response.body', 'body': f"retry: {int(LIVE_TICK_SECONDS * 1000)}\n\n".encode('utf-8'), 'more_body': True})
+        while not disconnected.done():
+            if broadcaster.seq != seen and broadcaster.message is not None:
+                seen = broadcaster.seq
+                await send({'type': 'http.response.body', 'body': broadcaster.message, 'more_body': True})
+                continue
+            changed = asyncio.ensure_future(broadcaster.changed.wait())
+            done, _ = await asyncio.wait({changed, disconnected}, timeout=LIVE_KEEPALIVE_SECONDS,
+                                         return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                changed.cancel()
+                await send({'type': 'http.response.body', 'body': b': keepalive\n\n', 'more_body': True})
+            elif changed not in done:
+                changed.cancel()
+    except OSError:
+        pass # Client went away mid-send
+    finally:
+        disconnected.cancel()
+        broadcaster.unsubscribe()
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await _lifespan(receive, send)
+        return
+    if scope['type'] == 'http':
+        dataset_name = _stream_dataset(scope)
+        if dataset_name is not None:
+            await live_stream(scope, receive, send, dataset_name)
+            return
+    await flask_application(scope, receive, send)
@@ -0,0 +1,297 @@
+"""Benchmarks and an in-process load test for the timetable app.
+
+    python benchmark.py                                  # bundled CSV scaled 1x, 10x, 100x
+    python benchmark.py --scales 1,1000 --requests 5000
+    python benchmark.py --output new.json --compare old.json
+
+For each scale it writes a synthetic CSV (the bundled one repeated, with
+divisions, rooms and teachers renamed per copy), then reports p50/p95/p99
+latency and throughput for:
+  * load_schedule_from_csv / load_snapshot_from_csv / the binary snapshot
+  * every build_*_grid, build_day_view and get_live_schedule, called directly
+  * every Flask route, driven through the test client with a weighted query
+    mix, once with the response cache cleared before each request ("cold")
+    and once with it warm.
+Results are saved as JSON so two runs can be compared with --compare;
+benchmark_reference.json holds a reference run at 1x, 10x, 100x and 1000x.
+Before benchmarking, a timetable with more distinct strings than 16-bit codes
+can hold is loaded and round-tripped through a binary snapshot, so the wide
+column path is checked on every run.
+"""
+import argparse
+import csv
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from urllib.parse import urlencode
+
+os.environ.setdefault('TT_RELOAD_INTERVAL', '0') # No watcher thread while benchmarking
+os.environ.setdefault('TT_LOG_LEVEL', 'ERROR') # The app logs to stdout; keep per-load lines out of the report
+
+import app as tt
+
+
+# --- SYNTHETIC DATASETS ---
+def generate_scaled_csv(source_path, scale, out_dir):
+    """Writes `scale` copies of the source CSV; copy k > 0 gets its own divisions, rooms and teachers."""
+    out_path = os.path.join(out_dir, f"timetable_{scale}x.csv")
+    if os.path.exists(out_path):
+        return out_path
+    with open(source_path, newline='', encoding='utf-8') as source:
+        reader = csv.DictReader(source)
+        fieldnames = reader.fieldnames
+        rows = list(reader)
+    with open(out_path, 'w', newline='', encoding='utf-8') as out:
+        writer = csv.DictWriter(out, fieldnames=fieldnames)
+        writer.writeheader()
+        for copy in range(scale):
+            for row in rows:
+                if copy:
+                    row = dict(row)
+                    row['Division'] = f"{row['Division']} S{copy}"
+                    row['Room'] = f"{row['Room']} B{copy}"
+                    if row['Teacher'].strip():
+                        row['Teacher'] = f"{row['Teacher']} T{copy}"
+                writer.writerow(row)
+    return out_path
+
+
+# --- TIMING ---
+def summarize(latencies, elapsed=None):
+    """p50/p95/p99/mean in milliseconds plus calls per second."""
+    if not latencies:
+        return {'count': 0}
+    ordered = sorted(latencies)
+
+    def percentile(p):
+        return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))] * 1000
+
+    total = elapsed if elapsed is not None else sum(latencies)
+    return {
+        'count': len(ordered),
+        'p50_ms': round(percentile(50), 4),
+        'p95_ms': round(percentile(95), 4),
+        'p99_ms': round(percentile(99), 4),
+        'mean_ms': round(sum(ordered) / len(ordered) * 1000, 4),
+        'throughput_per_s': round(len(ordered) / total, 1) if total else None,
+    }
+
+def time_calls(fn, argument_lists, repeat=1):
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for args in argument_lists:
+            t0 = time.perf_counter()
+            fn(*args)
+            latencies.append(time.perf_counter() - t0)
+    elapsed = time.perf_counter() - started
+    return summarize(latencies, elapsed)
+
+
+# --- BENCHMARKS ---
+def bench_loading(csv_path, repeat):
+    results = {
+        'load_schedule_from_csv': time_calls(lambda: tt.load_schedule_from_csv(csv_path), [()] * repeat),
+        'load_snapshot_from_csv': time_calls(lambda: tt.load_snapshot_from_csv(csv_path), [()] * repeat),
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        snapshot_path = os.path.join(tmp, 'bench.ttsnap')
+        tt.write_binary_snapshot(tt.load_snapshot_from_csv(csv_path), snapshot_path)
+        # The snapshot was built from csv_path, so it is current for it.
+        results['read_binary_snapshot'] = time_calls(lambda: tt.read_binary_snapshot(snapshot_path, csv_path), [()] * repeat)
+    return results
+
+def bench_builders(snapshot, repeat):
+    live_args = [(day, slot, snapshot) for day in tt.DAYS_ORDER for slot in tt.TIME_SLOTS]
+    return {
+        'build_classroom_grid': time_calls(tt.build_classroom_grid, [(v, snapshot) for v in snapshot.classrooms], repeat),
+        'build_teacher_grid': time_calls(tt.build_teacher_grid, [(v, snapshot) for v in snapshot.teachers], repeat),
+        'build_subject_grid': time_calls(tt.build_subject_grid, [(v, snapshot) for v in snapshot.subjects], repeat),
+        'build_labs_grid': time_calls(tt.build_labs_grid, [(v, snapshot) for v in snapshot.lab_subjects], repeat),
+        'build_day_view': time_calls(tt.build_day_view, [(v, snapshot) for v in tt.DAYS_ORDER], repeat),
+        'get_live_schedule': time_calls(tt.get_live_schedule, live_args, repeat),
+    }
+
+# Weights roughly follow real traffic: the live view dominates, then single-entity grids.
+ROUTE_MIX = [
+    ('/get_live_schedule', 40),
+    ('/get_by_classroom', 15),
+    ('/get_by_teacher', 15),
+    ('/get_by_subject', 10),
+    ('/get_by_day', 8),
+    ('/get_by_labs', 7),
+    ('/get_free_rooms', 5),
+    ('/get_batch', 3), # Kiosks and dashboards: several grids of one view per request
+    ('/', 3),
+]
+BATCH_SIZE = 8
+
+def make_request_mix(snapshot, count, seed):
+    rng = random.Random(seed)
+    routes, weights = zip(*ROUTE_MIX)
+    choices = {
+        '/get_by_classroom': snapshot.classrooms,
+        '/get_by_teacher': snapshot.teachers,
+        '/get_by_subject': snapshot.subjects,
+        '/get_by_labs': snapshot.lab_subjects,
+        '/get_by_day': tt.DAYS_ORDER,
+    }
+    urls = []
+    for route in rng.choices(routes, weights=weights, k=count):
+        if route == '/get_live_schedule':
+            query = {'day': rng.choice(tt.DAYS_ORDER), 'slot': rng.choice(tt.TIME_SLOTS)}
+        elif route == '/get_free_rooms':
+            query = {'day': rng.choice(tt.DAYS_ORDER), 'slot': rng.choice(tt.TIME_SLOTS)}
+        elif route == '/get_batch':
+            view, values = rng.choice([('classroom', snapshot.classrooms), ('teacher', snapshot.teachers)])
+            query = [('view', view)] + [('value', v) for v in rng.sample(values, min(BATCH_SIZE, len(values)))]
+        elif route == '/':
+            query = {}
+        else:
+            query = {'value': rng.choice(choices[route])}
+        urls.append((route, f"{route}?{urlencode(query)}" if query else route))
+    return urls
+
+def run_load_test(urls, cold):
+    client = tt.app.test_client()
+    per_route = {}
+    latencies = []
+    started = time.perf_counter()
+    for route, url in urls:
+        if cold:
+            tt.RESPONSE_CACHE.clear()
+        t0 = time.perf_counter()
+        response = client.get(url)
+        latency = time.perf_counter() - t0
+        if response.status_code != 200:
+            raise RuntimeError(f"{url} returned {response.status_code}")
+        latencies.append(latency)
+        per_route.setdefault(route, []).append(latency)
+    elapsed = time.perf_counter() - started
+    return {
+        'overall': summarize(latencies, elapsed),
+        'routes': {route: summarize(values) for route, values in sorted(per_route.items())},
+    }
+
+def bench_dataset(csv_path, args):
+    snapshot = tt.load_snapshot_from_csv(csv_path)
+    tt.publish_snapshot(snapshot)
+    tt.RESPONSE_CACHE.clear()
+    urls = make_request_mix(snapshot, args.requests, args.seed)
+    return {
+        'rows': len(snapshot.schedule),
+        'entities': {
+            'classrooms': len(snapshot.classrooms),
+            'teachers': len(snapshot.teachers),
+            'subjects': len(snapshot.subjects),
+            'lab_subjects': len(snapshot.lab_subjects),
+        },
+        'loading': bench_loading(csv_path, args.load_repeat),
+        'builders': bench_builders(snapshot, args.repeat),
+        'load_test': {
+            'cold': run_load_test(urls, cold=True),
+            'warm': run_load_test(urls, cold=False),
+        },
+    }
+
+
+# --- CHECKS ---
+WIDE_STRING_COUNT = 0x10000 + 1000 # Past what array('H') code columns can hold
+
+def check_wide_string_table(out_dir):
+    """Loads a timetable with more than 65535 distinct teachers, from the CSV and from a
+    binary snapshot, and fails loudly if either path cannot hold the wide codes."""
+    csv_path = os.path.join(out_dir, 'wide_strings.csv')
+    with open(csv_path, 'w', newline='', encoding='utf-8') as out:
+        writer = csv.writer(out)
+        writer.writerow(tt.CSV_COLUMNS)
+        for i in range(WIDE_STRING_COUNT):
+            writer.writerow(['Maths', f"Teacher {i}", 'Division 1', tt.DAYS_ORDER[i % 6], tt.TIME_SLOTS[i % 10], 'NC01'])
+    snapshot = tt.load_snapshot_from_csv(csv_path)
+    error = snapshot.validate()
+    if error or len(snapshot.teachers) != WIDE_STRING_COUNT:
+        raise RuntimeError(f"wide string table check failed: {error or f'{len(snapshot.teachers)} teachers loaded'}")
+    snapshot_path = tt.get_binary_snapshot_path(csv_path)
+    tt.write_binary_snapshot(snapshot, snapshot_path)
+    mapped = tt.read_binary_snapshot(snapshot_path, csv_path)
+    last = WIDE_STRING_COUNT - 1
+    if mapped is None or mapped.schedule[last]['teacher'] != f"Teacher {last}":
+        raise RuntimeError('wide string table check failed: the binary snapshot did not round-trip')
+
+
+# --- REPORTING ---
+def iter_metrics(results, path=()):
+    """Yields (path, stats) for every summarize() dict in a results tree."""
+    for key, value in results.items():
+        if isinstance(value, dict) and 'p50_ms' in value:
+            yield path + (key,), value
+        elif isinstance(value, dict):
+            yield from iter_metrics(value, path + (key,))
+
+def print_results(results):
+    for path, stats in iter_metrics(results['datasets']):
+        print(f"{' / '.join(path):<60} p50 {stats['p50_ms']:>9.3f} ms  p95 {stats['p95_ms']:>9.3f} ms  "
+              f"p99 {stats['p99_ms']:>9.3f} ms  {stats['throughput_per_s'] or 0:>10.1f}/s")
+
+def print_comparison(old, new):
+    old_metrics = dict(iter_metrics(old['datasets']))
+    print(f"\n{'metric':<60} {'old p50':>10} {'new p50':>10} {'change':>8}")
+    for path, stats in iter_metrics(new['datasets']):
+        before = old_metrics.get(path)
+        if not before or not before['p50_ms']:
+            continue
+        change = stats['p50_ms'] / before['p50_ms']
+        print(f"{' / '.join(path):<60} {before['p50_ms']:>10.3f} {stats['p50_ms']:>10.3f} {change:>7.2f}x")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n', 1)[0])
+    parser.add_argument('--csv', default=tt.CSV_PATH, help='Source timetable to scale (default: the bundled CSV).')
+    parser.add_argument('--scales', default='1,10,100', help='Comma-separated scale factors, e.g. 1,10,100,1000.')
+    parser.add_argument('--requests', type=int, default=2000, help='Requests per load-test run.')
+    parser.add_argument('--repeat', type=int, default=3, help='Passes over every value for the builder benchmarks.')
+    parser.add_argument('--load-repeat', type=int, default=3, help='Loads per dataset for the loading benchmarks.')
+    parser.add_argument('--seed', type=int, default=2025, help='Seed for the load-test query mix.')
+    parser.add_argument('--data-dir', default=None, help='Where synthetic CSVs are written (default: a temp dir).')
+    parser.add_argument('--output', default='benchmark_results.json', help='JSON file to write results to.')
+    parser.add_argument('--compare', default=None, help='Earlier results JSON to compare against.')
+    args = parser.parse_args(argv)
+
+    scales = [int(s) for s in args.scales.split(',') if s.strip()]
+    data_dir = args.data_dir or tempfile.mkdtemp(prefix='tt-bench-')
+    os.makedirs(data_dir, exist_ok=True)
+
+    results = {
+        'meta': {
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'source_csv': os.path.abspath(args.csv),
+            'requests': args.requests,
+            'seed': args.seed,
+        },
+        'datasets': {},
+    }
+    check_wide_string_table(data_dir)
+    for scale in scales:
+        csv_path = generate_scaled_csv(args.csv, scale, data_dir)
+        print(f"Benchmarking {scale}x ({csv_path})...", file=sys.stderr)
+        results['datasets'][f"{scale}x"] = bench_dataset(csv_path, args)
+
+    with open(args.output, 'w', encoding='utf-8') as out:
+        json.dump(results, out, indent=2)
+    print_results(results)
+    print(f"\nSaved results to {args.output}", file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as previous:
+            print_comparison(json.load(previous), results)
+
+
+if __name__ == '__main__':
+    main()
@@ -46,6 +46,59 @@ document.addEventListener('DOMContentLoaded', () => {
     let containerWidth = 0;
     let currentTable = null;
 
+    // Dataset: /d/<name>/ pages prefix every API path, ?dataset=<name> pages append it.
+    // The compact wire format is opt-in (open the page with ?format=compact): once gzip or brotli
+    // is applied the plain JSON is smaller, so it only pays off where responses go uncompressed.
+    // expandCompact() turns it back into the plain payload.
+    const apiBase = document.body.dataset.apiBase || '';
+    const datasetParam = document.body.dataset.dataset || '';
+    const compactFormat = new URLSearchParams(window.location.search).get('format') === 'compact';
+    const apiUrl = (path) => {
+        const params = new URLSearchParams();
+        if (compactFormat) params.set('format', 'compact');
+        if (datasetParam) params.set('dataset', datasetParam);
+        const query = params.toString();
+        if (!query) return `${apiBase}${path}`;
+        return `${apiBase}${path}${path.includes('?') ? '&' : '?'}${query}`;
+    };
+
+    // Mirrors COMPACT_GRIDS / COMPACT_RECORD_LISTS in app.py
+    const COMPACT_GRIDS = { grid: 'rows', classroom_grid: 'rows', lab_grid: 'lab_rows' };
+    const COMPACT_RECORD_LISTS = ['theory_classes', 'lab_classes', 'scheduled_labs'];
+
+    const expandCompact = (data) => {
+        if (!data || data.format !== 'compact') return data;
+        const strings = data.strings;
+        const cellText = (code) => Array.isArray(code) ? code.map(c => strings[c]).join('<br>') : strings[code];
+        const expanded = { ...data };
+        delete expanded.format;
+        delete expanded.strings;
+
+        Object.entries(COMPACT_GRIDS).forEach(([gridKey, rowsKey]) => {
+            const matrix = data[gridKey];
+            if (!Array.isArray(matrix)) return;
+            const grid = {};
+            (data[rowsKey] || []).forEach((row, i) => {
+                const cells = {};
+                data.columns.forEach((column, j) => {
+                    if (matrix[i][j] !== 0) cells[column] = cellText(matrix[i][j]);
+                });
+                grid[row] = cells;
+            });
+            expanded[gridKey] = grid;
+        });
+        COMPACT_RECORD_LISTS.forEach((listKey) => {
+            const list = data[listKey];
+            if (!list || !Array.isArray(list.records)) return;
+            expanded[listKey] = list.records.map(codes => {
+                const record = {};
+                list.fields.forEach((field, i) => { record[field] = strings[codes[i]]; });
+                return record;
+            });
+        });
+        return expanded;
+    };
+
     // --- 2. MASTER MODE TOGGLE LOGIC ---
 
     liveViewBtn.addEventListener('click', () => {
@@ -79,14 +132,14 @@ document.addEventListener('DOMContentLoaded', () => {
         liveDisplayDiv.innerHTML = '<p class="loading">Finding schedule...</p>';
         
         try {
-            const url = `/get_live_schedule?day=${encodeURIComponent(selectedDay)}&slot=${encodeURIComponent(selectedSlot)}`;
+            const url = apiUrl(`/get_live_schedule?day=${encodeURIComponent(selectedDay)}&slot=${encodeURIComponent(selectedSlot)}`);
             const response = await fetch(url);
             
             if (!response.ok) {
                 const errorData = await response.json().catch(() => ({ error: 'Could not fetch schedule.' }));
                 throw new Error(errorData.error || `HTTP error! status: ${response.status}`);
             }
-            const data = await response.json();
+            const data = expandCompact(await response.json());
             liveDisplayDiv.innerHTML = buildLiveScheduleHTML(data);
             
         } catch (error) {
@@ -194,13 +247,13 @@ document.addEventListener('DOMContentLoaded', () => {
         tableNav.style.display = 'none';
 
         try {
-            const url = requiresValue ? `${endpoint}?value=${encodeURIComponent(selectedValue)}` : endpoint;
+            const url = apiUrl(requiresValue ? `${endpoint}?value=${encodeURIComponent(selectedValue)}` : endpoint);
             const response = await fetch(url);
             if (!response.ok) {
                 const errorData = await response.json().catch(() => ({ error: 'Could not fetch schedule.' }));
                 throw new Error(errorData.error || `HTTP error! status: ${response.status}`);
             }
-            const data = await response.json();
+            const data = expandCompact(await response.json());
 
             if (data.grid_type === 'hybrid_day_view') {
                 advDisplayDiv.innerHTML = buildHybridDayViewHTML(data);
@@ -499,10 +552,74 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     };
 
+    // --- 9. LIVE "NOW" STREAM (ASGI mode, see asgi.py) ---
+    // The server pushes the current slot's classes whenever the slot rolls over;
+    // follow it until the user picks a day or time slot by hand.
+    const subscribeToLiveStream = () => {
+        const streamPath = document.body.dataset.liveStream;
+        if (!streamPath || !window.EventSource) return;
+
+        let followingNow = true;
+        liveDaySelect.addEventListener('change', () => { followingNow = false; });
+        liveTimeSelect.addEventListener('change', () => { followingNow = false; });
+
+        const params = datasetParam ? `?dataset=${encodeURIComponent(datasetParam)}` : '';
+        const source = new EventSource(`${apiBase}${streamPath}${params}`);
+        source.addEventListener('live', (event) => {
+            if (!followingNow) return;
+            const data = JSON.parse(event.data);
+            if (!data.slot) {
+                liveDisplayDiv.innerHTML = `<p class="placeholder">No classes Going on right now, try manually</p>`;
+                return;
+            }
+            liveDaySelect.value = data.day;
+            liveTimeSelect.value = data.slot;
+            liveDisplayDiv.innerHTML = buildLiveScheduleHTML(data.schedule);
+        });
+    };
+
+    // --- 10. TYPEAHEAD SEARCH (lists too long to embed, see EMBED_OPTIONS_MAX) ---
+    // Such lists render as <input data-search-kind> + <datalist>; the datalist is
+    // refilled from /search as the user types, and .value is read like a select's.
+    const attachTypeahead = (input) => {
+        const datalist = document.getElementById(input.getAttribute('list'));
+        let timer = null;
+        let controller = null;
+
+        input.addEventListener('input', () => {
+            clearTimeout(timer);
+            const query = input.value.trim();
+            if (!query) {
+                datalist.innerHTML = '';
+                return;
+            }
+            timer = setTimeout(async () => {
+                if (controller) controller.abort(); // Only the latest keystroke's answer matters
+                controller = new AbortController();
+                const params = new URLSearchParams({ q: query, kind: input.dataset.searchKind, limit: 20 });
+                try {
+                    const response = await fetch(apiUrl(`/search?${params}`), { signal: controller.signal });
+                    if (!response.ok) return;
+                    const data = await response.json();
+                    datalist.innerHTML = '';
+                    data.results.forEach(result => {
+                        const option = document.createElement('option');
+                        option.value = result.value;
+                        datalist.appendChild(option);
+                    });
+                } catch (error) {
+                    if (error.name !== 'AbortError') console.error('Search failed:', error);
+                }
+            }, 120);
+        });
+    };
+    document.querySelectorAll('input[data-search-kind]').forEach(attachTypeahead);
+
     // Attach button listeners
     liveShowBtn.addEventListener('click', fetchLiveSchedule);
     advShowButton.addEventListener('click', fetchAdvancedSchedule);
 
     // Run the app!
     initializeLiveView(); // Run on page load
+    subscribeToLiveStream();
 });
\ No newline at end of file